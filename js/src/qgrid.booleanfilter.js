@@ -72,6 +72,10 @@ class BooleanFilter extends filter_base.FilterBase {
     });
   }
 
+  set_filter_info(filter_info) {
+    this.selected = filter_info ? filter_info.selected : null;
+  }
+
   is_active() {
     return this.selected != null;
   }
@@ -11,6 +11,7 @@ class DateFilter extends filter_base.FilterBase {
           <i class='fa fa-times icon-remove close-button'/>
         </h3>
         <div class='dropdown-body'>
+          <div class='range-histogram'/>
           <input class='datepicker ignore start-date'/>
           <span class='to'>to</span>
           <input class='datepicker ignore end-date'/>
@@ -25,6 +26,7 @@ class DateFilter extends filter_base.FilterBase {
   update_min_max(col_info, has_active_filter) {
     this.min_value = col_info.filter_min;
     this.max_value = col_info.filter_max;
+    this.histogram = col_info.histogram;
 
     var filter_info = col_info.filter_info;
     if (filter_info) {
@@ -56,6 +58,7 @@ class DateFilter extends filter_base.FilterBase {
 
   initialize_controls() {
     super.initialize_controls();
+    this.render_histogram();
     this.min_date = new Date(this.min_value);
     this.max_date = new Date(this.max_value);
 
@@ -139,6 +142,11 @@ class DateFilter extends filter_base.FilterBase {
     };
   }
 
+  set_filter_info(filter_info) {
+    this.filter_start_date = filter_info ? filter_info.min : null;
+    this.filter_end_date = filter_info ? filter_info.max : null;
+  }
+
   is_active() {
     return this.filter_start_date || this.filter_end_date;
   }
@@ -165,12 +165,42 @@ class FilterBase {
     );
   }
 
-  send_filter_changed() {
+  /**
+   * Draw the histogram of the column's values that's sent along with the
+   * min and max values for slider and date filters.
+   */
+  render_histogram() {
+    var histogram_elem = this.filter_elem.find('.range-histogram');
+    histogram_elem.empty();
+    if (!this.histogram || this.histogram.length == 0) {
+      histogram_elem.addClass('hidden');
+      return;
+    }
+    histogram_elem.removeClass('hidden');
+
+    var max_count = Math.max.apply(null, this.histogram);
+    var bar_width = 100 / this.histogram.length;
+    this.histogram.forEach((count) => {
+      $("<div class='histogram-bar'>")
+        .css({
+          width: `${bar_width}%`,
+          height: `${max_count ? 100 * count / max_count : 0}%`
+        })
+        .attr('title', count)
+        .appendTo(histogram_elem);
+    });
+  }
+
+  update_filter_button_active() {
     if (this.is_active()){
       this.filter_btn.addClass("filter-active");
     } else {
       this.filter_btn.removeClass("filter-active");
     }
+  }
+
+  send_filter_changed() {
+    this.update_filter_button_active();
 
     var msg = {
       'type': 'change_filter',
@@ -202,6 +232,14 @@ class FilterBase {
   get_filter_info() {
     throw new Error("not implemented!");
   }
+
+  /**
+   * Update the state of the filter to match a filter that was set from
+   * python (via the set_state method), without showing the filter.
+   */
+  set_filter_info(filter_info) {
+    throw new Error("not implemented!");
+  }
 }
 
 module.exports = {'FilterBase': FilterBase};
@@ -10,6 +10,7 @@ class SliderFilter extends filter_base.FilterBase {
           <i class='fa fa-times icon-remove close-button'/>
         </h3>
         <div class='dropdown-body'>
+          <div class='range-histogram'/>
           <div class='slider-range'/>
           <span class='slider-label'>
             <span class='min-value'>0</span>
@@ -27,6 +28,7 @@ class SliderFilter extends filter_base.FilterBase {
   initialize_controls() {
     super.initialize_controls();
     this.slider_elem = this.filter_elem.find(".slider-range");
+    this.render_histogram();
 
     var values_to_set = [
       this.filter_value_min || this.min_value,
@@ -110,6 +112,7 @@ class SliderFilter extends filter_base.FilterBase {
   update_min_max(col_info, has_active_filter) {
     this.min_value = col_info.slider_min;
     this.max_value = col_info.slider_max;
+    this.histogram = col_info.histogram;
 
     var filter_info = col_info.filter_info;
     if (filter_info) {
@@ -128,6 +131,11 @@ class SliderFilter extends filter_base.FilterBase {
     }
   }
 
+  set_filter_info(filter_info) {
+    this.filter_value_min = filter_info ? filter_info.min : null;
+    this.filter_value_max = filter_info ? filter_info.max : null;
+  }
+
   get_filter_info() {
     return {
       "field": this.field,
@@ -21,6 +21,7 @@ class TextFilter extends filter_base.FilterBase {
         <div class='dropdown-footer'>
           <a class='select-all-link' href='#'>Select All</a>
           <a class='reset-link' href='#'>Reset</a>
+          <span class='index-memory'/>
         </div>
       </div>
     `;
@@ -36,7 +37,9 @@ class TextFilter extends filter_base.FilterBase {
 
   update_min_max(col_info, has_active_filter) {
     this.values = col_info.values;
+    this.value_counts = col_info.value_counts;
     this.length = col_info.length;
+    this.index_memory = col_info.index_memory;
     this.value_range = col_info.value_range;
     this.selected_rows = [];
     for (var i = 0; i < col_info.selected_length; i++) {
@@ -54,6 +57,7 @@ class TextFilter extends filter_base.FilterBase {
 
     this.update_timeout = setTimeout(() => {
       this.values = col_info.values;
+      this.value_counts = col_info.value_counts;
       this.length = col_info.length;
       this.value_range = col_info.value_range;
 
@@ -79,10 +83,11 @@ class TextFilter extends filter_base.FilterBase {
   }
 
   update_slick_grid_data() {
-    this.grid_items = this.values.map(function (value, index) {
+    this.grid_items = this.values.map((value, index) => {
       return {
         id: value,
-        value: value
+        value: value,
+        count: this.value_counts ? this.value_counts[index] : null
       };
     });
 
@@ -109,6 +114,13 @@ class TextFilter extends filter_base.FilterBase {
     this.filter_grid_elem = this.filter_elem.find(".text-filter-grid");
     this.search_string = "";
 
+    // show how much memory the index used to apply this filter takes up
+    if (this.index_memory) {
+      this.filter_elem.find(".index-memory")
+        .text(this.format_memory(this.index_memory))
+        .attr('title', 'Memory used by the index for this filter');
+    }
+
     this.update_slick_grid_data();
 
     this.sort_comparer = (x, y) => {
@@ -133,7 +145,12 @@ class TextFilter extends filter_base.FilterBase {
     };
 
     var row_formatter = function (row, cell, value, columnDef, dataContext) {
-      return "<span class='text-filter-value'>" + dataContext.value + "</span>";
+      var html = "<span class='text-filter-value'>" + dataContext.value + "</span>";
+      // the number of rows with this value, under the other columns' filters
+      if (dataContext.count !== null && dataContext.count !== undefined) {
+        html += "<span class='text-filter-count'>" + dataContext.count + "</span>";
+      }
+      return html;
     };
 
     var checkboxSelector = new Slick.CheckboxSelectColumn({
@@ -245,6 +262,16 @@ class TextFilter extends filter_base.FilterBase {
     }, 10);
   }
 
+  format_memory(num_bytes) {
+    var units = ['B', 'KB', 'MB', 'GB'];
+    var unit_index = 0;
+    while (num_bytes >= 1024 && unit_index < units.length - 1) {
+      num_bytes /= 1024;
+      unit_index += 1;
+    }
+    return `${num_bytes.toFixed(unit_index == 0 ? 0 : 1)} ${units[unit_index]}`;
+  }
+
   toggle_row_selected(row_index) {
     var old_selected_rows = this.row_selection_model.getSelectedRows();
     // if the row is already selected, remove it from the selected rows array.
@@ -350,6 +377,11 @@ class TextFilter extends filter_base.FilterBase {
     this.send_filter_changed();
   }
 
+  set_filter_info(filter_info) {
+    this.filter_list = filter_info ? filter_info.selected : null;
+    this.excluded_rows = filter_info ? filter_info.excluded : null;
+  }
+
   is_active() {
     return this.filter_list != null;
   }
@@ -115,6 +115,19 @@ class QgridView extends widgets.DOMWidgetView {
     });
     this.buttons.tooltip('disable');
 
+    this.filter_expression_input = $(`
+      <input type='text' class='filter-expression'
+        placeholder="Filter expression, e.g. price > 100 and venue in ('X', 'Y')"/>
+    `).appendTo(this.toolbar);
+    this.filter_expression_input.val(
+      this.model.get('_filter_expression_text')
+    );
+    this.model.on('change:_filter_expression_text', () => {
+      this.filter_expression_input.val(
+        this.model.get('_filter_expression_text')
+      );
+    });
+
     this.full_screen_btn = null;
     if (dialog) {
       this.full_screen_modal = $('body').find('.qgrid-modal');
@@ -161,6 +174,15 @@ class QgridView extends widgets.DOMWidgetView {
       clicked.addClass('disabled');
       this.send({'type': clicked.attr('data-event-type')});
     });
+    this.filter_expression_input.off('keyup');
+    this.filter_expression_input.keyup((e) => {
+      if (e.keyCode == 13) { // enter key
+        this.send({
+          'type': 'change_filter_expression',
+          'expression': this.filter_expression_input.val()
+        });
+      }
+    });
     if (!this.full_screen_btn) {
       return;
     }
@@ -222,10 +244,12 @@ class QgridView extends widgets.DOMWidgetView {
     this.last_vp = null;
     this.sort_in_progress = false;
     this.sort_indicator = null;
+    this.operation_in_progress = false;
     this.resizing_column = false;
     this.ignore_selection_changed = false;
     this.vp_response_expected = false;
     this.next_viewport_msg = null;
+    this.selection_ranges = [];
 
     var number_type_info = {
       filter: slider_filter.SliderFilter,
@@ -469,15 +493,21 @@ class QgridView extends widgets.DOMWidgetView {
 
       this.sort_in_progress = true;
 
-      if (this.sorted_column == column){
-        this.sort_ascending = !this.sort_ascending;
+      // shift-clicking a header adds that column as an additional sort
+      // key, or flips its direction if it's already being sorted by
+      var sort_columns = this.model.get('_sort_columns') || [];
+      var multi = e.shiftKey && sort_columns.length > 0;
+      var existing_sort = sort_columns.find((sort) => {
+        return sort[0] == column.field;
+      });
+
+      this.sorted_column = column;
+      if (existing_sort && (multi || sort_columns.length == 1)) {
+        this.sort_ascending = !existing_sort[1];
+      } else if ('defaultSortAsc' in column) {
+        this.sort_ascending = column.defaultSortAsc;
       } else {
-        this.sorted_column = column;
-        if ('defaultSortAsc' in column) {
-          this.sort_ascending = column.defaultSortAsc;
-        } else{
-          this.sort_ascending = true;
-        }
+        this.sort_ascending = true;
       }
 
       var all_classes = 'fa-sort-asc fa-sort-desc fa fa-spin fa-spinner';
@@ -488,13 +518,16 @@ class QgridView extends widgets.DOMWidgetView {
       }
 
       this.sort_indicator = clicked_column_sort_indicator;
+      if (!multi) {
+        this.grid_elem.find('.slick-sort-indicator').removeClass(all_classes);
+      }
       this.sort_indicator.removeClass(all_classes);
-      this.grid_elem.find('.slick-sort-indicator').removeClass(all_classes);
       this.sort_indicator.addClass(`fa fa-spinner fa-spin`);
       var msg = {
         'type': 'change_sort',
         'sort_field': this.sorted_column.field,
-        'sort_ascending': this.sort_ascending
+        'sort_ascending': this.sort_ascending,
+        'multi': multi
       };
       this.send(msg);
     };
@@ -529,13 +562,16 @@ class QgridView extends widgets.DOMWidgetView {
     });
 
     // set up callbacks
-    let editable_rows = this.model.get('_editable_rows');
-    if (editable_rows && Object.keys(editable_rows).length > 0) {
-      this.slick_grid.onBeforeEditCell.subscribe((e, args) => {
-        editable_rows = this.model.get('_editable_rows');
+    this.slick_grid.onBeforeEditCell.subscribe((e, args) => {
+      // don't allow edits while a sort or filter runs in the background
+      if (this.operation_in_progress) {
+        return false;
+      }
+      let editable_rows = this.model.get('_editable_rows');
+      if (editable_rows && Object.keys(editable_rows).length > 0) {
         return editable_rows[args.item[this.index_col_name]]
-      });
-    }
+      }
+    });
 
     this.slick_grid.onCellChange.subscribe((e, args) => {
       var column = this.columns[args.cell].name;
@@ -546,9 +582,69 @@ class QgridView extends widgets.DOMWidgetView {
       this.send(msg);
     });
 
+    // ctrl+z undoes the last edit, ctrl+y or ctrl+shift+z redoes it,
+    // ctrl+d fills the active cell's value down to the selected rows below,
+    // and ctrl+a selects every row, as a single range
+    this.slick_grid.onKeyDown.subscribe((e, args) => {
+      if (!(e.ctrlKey || e.metaKey) || this.slick_grid.getCellEditor()) {
+        return;
+      }
+      var key = String.fromCharCode(e.which).toLowerCase();
+      var msg = null;
+      if (key == 'a') {
+        this.selection_ranges = [[0, this.df_length]];
+        this.highlight_selection();
+        msg = {'type': 'change_selection', 'ranges': this.selection_ranges};
+      } else if (!this.can_edit_range()) {
+        return;
+      } else if (key == 'z') {
+        msg = {'type': e.shiftKey ? 'redo' : 'undo'};
+      } else if (key == 'y') {
+        msg = {'type': 'redo'};
+      } else if (key == 'd') {
+        msg = this.get_fill_down_msg();
+      }
+      if (msg) {
+        e.preventDefault();
+        e.stopImmediatePropagation();
+        this.send(msg);
+      }
+    });
+
+    // a block of cells copied from a spreadsheet is pasted as tab separated
+    // text, which is sent to be written in a single message
+    this.grid_elem.off('paste');
+    this.grid_elem.on('paste', (e) => {
+      var active_cell = this.slick_grid.getActiveCell();
+      if (!active_cell || !this.can_edit_range()) {
+        return;
+      }
+      var clipboard = e.originalEvent.clipboardData || window.clipboardData;
+      var values = this.parse_tsv(clipboard.getData('text'));
+      var columns = this.get_range_columns(active_cell.cell,
+                                           values.length ? values[0].length : 0);
+      if (!columns) {
+        return;
+      }
+      e.preventDefault();
+      var row_end = Math.min(active_cell.row + values.length, this.df_length);
+      this.send({
+        'type': 'paste_cells',
+        'row_start': active_cell.row,
+        'row_end': row_end,
+        'columns': columns,
+        'values': values.slice(0, row_end - active_cell.row)
+      });
+    });
+
     this.slick_grid.onSelectedRowsChanged.subscribe((e, args) => {
       if (!this.ignore_selection_changed) {
-        var msg = {'rows': args.rows, 'type': 'change_selection'};
+        // a shift-click selects a block of rows, which is sent as a range
+        this.selection_ranges = this.rows_to_ranges(args.rows);
+        var msg = {
+          'ranges': this.selection_ranges,
+          'type': 'change_selection'
+        };
         this.send(msg);
       }
     });
@@ -588,6 +684,9 @@ class QgridView extends widgets.DOMWidgetView {
   }
 
   has_active_filter() {
+    if (this.model.get('_filter_expression_text')) {
+      return true;
+    }
     for (var i=0; i < this.filter_list.length; i++){
       var cur_filter = this.filter_list[i];
       if (cur_filter.is_active()){
@@ -620,6 +719,132 @@ class QgridView extends widgets.DOMWidgetView {
     };
   }
 
+  /**
+   * Convert a list of selected rows into a sorted list of [start, end)
+   * ranges of consecutive rows.
+   */
+  rows_to_ranges(rows) {
+    var ranges = [];
+    rows.slice().sort((a, b) => a - b).forEach((row) => {
+      var last = ranges[ranges.length - 1];
+      if (last && row <= last[1]) {
+        last[1] = Math.max(last[1], row + 1);
+      } else {
+        ranges.push([row, row + 1]);
+      }
+    });
+    return ranges;
+  }
+
+  /**
+   * Highlight the selected rows which are in the range of rows that the
+   * grid has data for. The selection is kept as ranges, so that selecting
+   * every row of a large DataFrame doesn't require a list of all of them.
+   */
+  highlight_selection() {
+    var rows = [];
+    var top = this.df_range[0];
+    var bottom = Math.min(this.df_range[1], this.df_length);
+    this.selection_ranges.forEach((range) => {
+      var end = Math.min(range[1], bottom);
+      for (var row = Math.max(range[0], top); row < end; row++) {
+        rows.push(row);
+      }
+    });
+    this.ignore_selection_changed = true;
+    this.slick_grid.setSelectedRows(rows);
+    this.ignore_selection_changed = false;
+  }
+
+  can_edit_range() {
+    return this.grid_options.editable != false &&
+      !this.operation_in_progress && !this.slick_grid.getCellEditor();
+  }
+
+  /**
+   * Get the names of ``count`` columns starting at the given cell, or null
+   * if any of them isn't editable (or if there aren't enough columns).
+   */
+  get_range_columns(cell, count) {
+    if (count == 0 || cell + count > this.columns.length) {
+      return null;
+    }
+    var columns = [];
+    for (var i = cell; i < cell + count; i++) {
+      var slick_column = this.columns[i];
+      if (!slick_column.editor || slick_column.editor == editors.IndexEditor) {
+        return null;
+      }
+      columns.push(slick_column.name);
+    }
+    return columns;
+  }
+
+  /**
+   * Split tab separated text into rows of values, ignoring the line break
+   * that spreadsheets add after the last row.
+   */
+  parse_tsv(text) {
+    var lines = (text || '').split(/\r\n|\n|\r/);
+    if (lines.length > 0 && lines[lines.length - 1] === '') {
+      lines.pop();
+    }
+    return lines.map((line) => line.split('\t'));
+  }
+
+  get_fill_down_msg() {
+    var active_cell = this.slick_grid.getActiveCell();
+    var rows = this.slick_grid.getSelectedRows();
+    if (!active_cell || rows.length < 2) {
+      return null;
+    }
+    var columns = this.get_range_columns(active_cell.cell, 1);
+    if (!columns) {
+      return null;
+    }
+    return {
+      'type': 'fill_down',
+      'row_start': Math.min(...rows),
+      'row_end': Math.max(...rows) + 1,
+      'columns': columns
+    };
+  }
+
+  /**
+   * Update the values of cells in the rows of a data view, given a list of
+   * [row, column, value] triples. Returns the rows that were changed.
+   */
+  apply_cell_patch(data_view, cells) {
+    var patched_rows = {};
+    cells.forEach((cell) => {
+      var item = data_view.getItem(cell[0]);
+      item[cell[1]] = cell[2];
+      patched_rows[cell[0]] = true;
+    });
+    return Object.keys(patched_rows).map(Number);
+  }
+
+  /**
+   * Update the values of cells in the model's copy of _df_json, which
+   * holds the rows in the range given by _df_range. The model isn't saved,
+   * since python already has the new values.
+   */
+  patch_df_json(cells) {
+    var df_range = this.model.get('_df_range');
+    var df_json = JSON.parse(this.model.get('_df_json'));
+    var patched = false;
+    cells.forEach((cell) => {
+      var row = df_json.data[cell[0] - df_range[0]];
+      if (row) {
+        row[cell[1]] = cell[2];
+        patched = true;
+      }
+    });
+    if (patched) {
+      this.model.set('_df_json', JSON.stringify(df_json));
+    }
+  }
+
   set_data_view(data_view) {
     this.data_view = data_view;
     this.slick_grid.setData(data_view);
@@ -712,15 +937,23 @@ class QgridView extends widgets.DOMWidgetView {
         }
 
         if (msg.triggered_by == 'change_sort' && this.sort_indicator) {
-          var asc = this.model.get('_sort_ascending');
-          this.sort_indicator.removeClass(
-              'fa-spinner fa-spin fa-sort-asc fa-sort-desc'
-          );
-          var fa_class = asc ? 'fa-sort-asc' : 'fa-sort-desc';
-          this.sort_indicator.addClass(fa_class);
+          this.update_sort_indicators();
           this.sort_in_progress = false;
         }
 
+        // filters and sorts that were set from python via set_state
+        if (msg.triggered_by == 'set_state') {
+          var columns = this.model.get('_columns');
+          this.filter_list.forEach((cur_filter) => {
+            var col_info = columns[cur_filter.field] || {};
+            cur_filter.set_filter_info(col_info.filter_info);
+            if (cur_filter.filter_btn) {
+              cur_filter.update_filter_button_active();
+            }
+          });
+          this.update_sort_indicators();
+        }
+
         let top_row = null;
         if (msg.triggered_by === 'remove_row') {
           top_row = this.slick_grid.getViewport().top;
@@ -762,14 +995,25 @@ class QgridView extends widgets.DOMWidgetView {
           this.slick_grid.scrollRowIntoView(this.last_vp.bottom);
         }
 
-        var selected_rows = this.slick_grid.getSelectedRows().filter((row) => {
-          return row < Math.min(this.df_length, this.df_range[1]);
-        });
+        this.selection_ranges = this.selection_ranges.map((range) => {
+          return [range[0], Math.min(range[1], this.df_length)];
+        }).filter((range) => range[0] < range[1]);
+        this.highlight_selection();
         this.send({
-          'rows': selected_rows,
+          'ranges': this.selection_ranges,
           'type': 'change_selection'
         });
       }, 100);
+    } else if (msg.type == 'patch_cells') {
+      // python doesn't send _df_json again for the patch, so the model's
+      // copy is patched here, both for a data view that's about to be
+      // created from it and for views of the widget that are shown later
+      this.patch_df_json(msg.cells);
+      var patched_rows = this.apply_cell_patch(this.data_view, msg.cells);
+      if (patched_rows.length > 0) {
+        this.slick_grid.invalidateRows(patched_rows);
+        this.slick_grid.render();
+      }
     } else if (msg.type == 'change_grid_option') {
       var opt_name = msg.option_name;
       var opt_val = msg.option_value;
@@ -778,20 +1022,79 @@ class QgridView extends widgets.DOMWidgetView {
         this.slick_grid.resizeCanvas();
       }
     } else if (msg.type == 'change_selection') {
-      this.ignore_selection_changed = true;
-      this.slick_grid.setSelectedRows(msg.rows);
-      if (msg.rows && msg.rows.length > 0) {
-        this.slick_grid.scrollRowIntoView(msg.rows[0]);
+      this.selection_ranges = msg.ranges;
+      this.highlight_selection();
+      if (msg.ranges.length > 0) {
+        this.slick_grid.scrollRowIntoView(msg.ranges[0][0]);
       }
-      this.ignore_selection_changed = false;
     } else if (msg.type == 'change_show_toolbar') {
       this.initialize_toolbar();
+    } else if (msg.type == 'operation_progress') {
+      this.update_operation_progress(msg);
     } else if (msg.col_info) {
       var filter = this.filters[msg.col_info.name];
       filter.handle_msg(msg);
     }
   }
 
+  /**
+   * Show a spinner while a sort or filter runs in the background, and
+   * disable the actions that would conflict with it.  Sorting and
+   * filtering stay enabled, since a new request cancels the running one.
+   */
+  update_operation_progress(msg) {
+    if (!this.progress_elem) {
+      this.progress_elem = $(`
+        <div class='q-grid-progress'>
+          <span class='fa fa-spinner fa-spin'/>
+          <span class='progress-text'/>
+        </div>
+      `).appendTo(this.grid_elem);
+    }
+
+    if (msg.state == 'started' || msg.state == 'progress') {
+      this.operation_in_progress = true;
+      this.sort_in_progress = false;
+      this.progress_elem.find('.progress-text').text(
+          `${Math.round(msg.progress * 100)}%`
+      );
+      this.progress_elem.show();
+      if (this.buttons) {
+        this.buttons.addClass('disabled');
+      }
+    } else {
+      // the buttons are enabled again by the 'update_data_view' message
+      this.operation_in_progress = false;
+      this.progress_elem.hide();
+    }
+  }
+
+  /**
+   * Show an ascending/descending indicator in the header of every column
+   * that the grid is currently sorted by.
+   */
+  update_sort_indicators() {
+    var all_classes = 'fa-sort-asc fa-sort-desc fa fa-spin fa-spinner';
+    var sort_columns = this.model.get('_sort_columns') || [];
+    this.grid_elem.find('.slick-sort-indicator').removeClass(all_classes);
+    this.grid_header.find('.slick-header-column').each((i, elem) => {
+      var col_header = $(elem);
+      var column = col_header.data('column');
+      var sort = sort_columns.find((sort) => {
+        return column && sort[0] == column.field;
+      });
+      if (!sort) {
+        return;
+      }
+      var indicator = col_header.find('.slick-sort-indicator');
+      if (indicator.length == 0) {
+        indicator =
+            $("<span class='slick-sort-indicator'/>").appendTo(col_header);
+      }
+      indicator.addClass(sort[1] ? 'fa fa-sort-asc' : 'fa fa-sort-desc');
+    });
+  }
+
   reset_in_progress_button() {
     if (this.in_progress_btn){
       this.in_progress_btn.removeClass('disabled');
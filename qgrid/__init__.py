@@ -6,6 +6,7 @@ from .grid import (
     set_defaults,
     on,
     off,
+    set_event_dispatch,
     set_grid_option,
     show_grid,
     QgridWidget,
@@ -30,6 +31,7 @@ __all__ = [
     "set_defaults",
     "on",
     "off",
+    "set_event_dispatch",
     "set_grid_option",
     "show_grid",
     "QgridWidget",
@@ -1,11 +1,16 @@
 import ipywidgets as widgets
 import pandas as pd
 import numpy as np
+import ast
 import json
+import operator
+import threading
+import time
 
+from datetime import date
 from types import FunctionType
 from IPython.display import display
-from numbers import Integral
+from numbers import Integral, Number
 from traitlets import (
     Unicode,
     Instance,
@@ -19,8 +24,15 @@ from traitlets import (
     parse_notifier_name
 )
 from itertools import chain
+from collections import deque
 from uuid import uuid4
 from six import string_types
+from six.moves import queue
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
 
 # versions of pandas prior to version 0.20.0 don't support the orient='table'
 # when calling the 'to_json' function on DataFrames.  to get around this we
@@ -100,6 +112,616 @@ class _DefaultSettings(object):
         return self._column_options
 
 
+class _OperationCancelled(Exception):
+    pass
+
+
+class _CancellationToken(object):
+    """
+    Passed to a long running operation, which checks it between steps so
+    that the operation can be abandoned once a newer one supersedes it.
+    """
+
+    def __init__(self, on_progress=None):
+        self.cancelled = False
+        self.on_progress = on_progress
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self, progress=None):
+        if self.cancelled:
+            raise _OperationCancelled()
+        if progress is not None and self.on_progress is not None:
+            self.on_progress(progress)
+
+
+class _PendingSort(object):
+    """
+    A sort whose full permutation is still being computed in the
+    background. The first ``len(top)`` rows of the sorted view are already
+    known (as positions in the unsorted view), which is enough to render
+    the viewport.  The full permutation is left in ``order`` once it has
+    been computed.
+    """
+
+    def __init__(self, keys, top):
+        self.keys = keys
+        self.top = top
+        self.order = None
+        self.thread = None
+
+
+class _SubstringIndex(object):
+    """
+    A case-insensitive substring index over a list of values, used to
+    search the values shown in a text filter's dropdown. The lowercase
+    string forms of the values are joined into one text, and each trigram
+    of the text is mapped to the (sorted) positions of the values that
+    contain it.
+    """
+
+    def __init__(self, values):
+        lowered = [stringify(x).lower() for x in values]
+        lengths = np.array([len(x) for x in lowered], dtype=np.int64)
+        self.starts = np.zeros(len(lowered), dtype=np.int64)
+        np.cumsum(lengths[:-1] + 1, out=self.starts[1:])
+        self.ends = self.starts + lengths
+        text = '\x00'.join(lowered)
+
+        self.chars = np.frombuffer(text.encode('utf-32-le'),
+                                   dtype=np.uint32)
+        chars = self.chars.astype(np.int64)
+        value_ids = np.repeat(np.arange(len(lowered)), lengths + 1)
+        # the value that each character of the text belongs to
+        self.char_values = value_ids.astype(np.int32)
+
+        # code points fit in 21 bits, so a trigram fits in an int64
+        grams = self._encode(chars)
+        is_sep = chars == 0
+        valid = ~(is_sep[:-2] | is_sep[1:-1] | is_sep[2:])
+        grams = grams[valid]
+        value_ids = value_ids[:len(chars) - 2][valid]
+
+        order = np.lexsort((value_ids, grams))
+        grams = grams[order]
+        value_ids = value_ids[order]
+        keep = np.ones(len(grams), dtype=bool)
+        keep[1:] = (grams[1:] != grams[:-1]) | \
+            (value_ids[1:] != value_ids[:-1])
+        grams = grams[keep]
+
+        self.grams, gram_starts = np.unique(grams, return_index=True)
+        self.offsets = np.append(gram_starts, len(grams))
+        self.value_ids = value_ids[keep]
+
+    @staticmethod
+    def _encode(chars):
+        if len(chars) < 3:
+            return np.zeros(0, dtype=np.int64)
+        return (chars[:-2] << 42) | (chars[1:-1] << 21) | chars[2:]
+
+    def search(self, search_val):
+        """
+        Get the positions of the values that contain ``search_val``
+        (ignoring case), in ascending order.
+        """
+        query = search_val.lower()
+        if query == '':
+            return np.arange(len(self.starts))
+        query_chars = np.frombuffer(query.encode('utf-32-le'),
+                                    dtype=np.uint32)
+        if (query_chars == 0).any():
+            return np.zeros(0, dtype=np.int64)
+        if len(query_chars) < 3:
+            # queries shorter than a trigram are found by scanning the text
+            return self._find(query_chars)
+
+        candidates = None
+        for gram in np.unique(self._encode(query_chars.astype(np.int64))):
+            i = np.searchsorted(self.grams, gram)
+            if i == len(self.grams) or self.grams[i] != gram:
+                return np.zeros(0, dtype=np.int64)
+            postings = self.value_ids[self.offsets[i]:self.offsets[i + 1]]
+            if candidates is None:
+                candidates = postings
+            else:
+                is_posting = np.zeros(len(self.starts), dtype=bool)
+                is_posting[postings] = True
+                candidates = candidates[is_posting[candidates]]
+
+        # containing all of the query's trigrams doesn't guarantee that a
+        # value contains the query, unless the query is a single trigram
+        if len(query_chars) > 3:
+            candidates = self._find(query_chars, candidates)
+        return candidates
+
+    def _find(self, query_chars, candidates=None):
+        """
+        Get the positions of the values, out of all of them or out of the
+        given ``candidates``, that contain the query.  The values are
+        separated by a character that's not in the query, so a match can't
+        span more than one value.
+        """
+        n_chars = len(self.chars)
+        n_starts = n_chars - len(query_chars) + 1
+        if n_starts <= 0:
+            return np.zeros(0, dtype=np.int64)
+
+        if candidates is not None and \
+                (self.ends[candidates] - self.starts[candidates]).sum() < \
+                n_chars // 8:
+            # when there are few candidates, only their characters are
+            # checked as places where the query could start
+            lengths = self.ends[candidates] - self.starts[candidates]
+            offsets = np.cumsum(lengths) - lengths
+            starts = np.arange(lengths.sum()) + np.repeat(
+                self.starts[candidates] - offsets, lengths
+            )
+            starts = starts[starts < n_starts]
+            first = 0
+        else:
+            # otherwise the whole text is compared with up to a trigram of
+            # the query, which leaves few enough places for the rest of it
+            # to be checked at
+            matches = self.chars[:n_starts] == query_chars[0]
+            for i in range(1, min(len(query_chars), 3)):
+                matches &= self.chars[i:n_starts + i] == query_chars[i]
+            starts = np.flatnonzero(matches)
+            first = min(len(query_chars), 3)
+
+        for i in range(first, len(query_chars)):
+            starts = starts[self.chars[starts + i] == query_chars[i]]
+        has_match = np.zeros(len(self.starts), dtype=bool)
+        has_match[self.char_values[starts]] = True
+        if candidates is not None:
+            return candidates[has_match[candidates]]
+        return np.flatnonzero(has_match)
+
+
+class _FilterExpression(object):
+    """
+    A filter expression such as ``price > 100 and venue in ('X', 'Y')``.
+    The expression is parsed and checked against the types of the columns
+    it refers to once, when it's created, and can then be evaluated into a
+    boolean mask over the rows of a DataFrame.  Masks are combined in place
+    as the expression is evaluated, so ``and``/``or``/``not`` don't create
+    a temporary array per operand.
+
+    Parameters
+    ----------
+    expression : str
+        The expression, written with Python syntax.  Columns are referred to
+        by name, and can be compared with each other or with constants,
+        tested for membership in a list of constants with ``in`` and
+        ``not in``, and combined with arithmetic operators.
+    column_types : dict
+        The types of the columns which the expression can refer to, as
+        they're given in the ``type`` key of ``QgridWidget._columns``.
+    """
+
+    _comparisons = {
+        ast.Eq: operator.eq,
+        ast.NotEq: operator.ne,
+        ast.Lt: operator.lt,
+        ast.LtE: operator.le,
+        ast.Gt: operator.gt,
+        ast.GtE: operator.ge
+    }
+    _reflected = {
+        ast.Eq: ast.Eq,
+        ast.NotEq: ast.NotEq,
+        ast.Lt: ast.Gt,
+        ast.LtE: ast.GtE,
+        ast.Gt: ast.Lt,
+        ast.GtE: ast.LtE
+    }
+    _arithmetic = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: operator.mul,
+        ast.Div: operator.truediv,
+        ast.Mod: operator.mod,
+        ast.Pow: operator.pow
+    }
+    _kinds = {
+        'boolean': 'bool',
+        'integer': 'number',
+        'number': 'number',
+        'datetime': 'datetime'
+    }
+
+    def __init__(self, expression, column_types):
+        self.expression = expression
+        self.columns = set()
+        self.mask = None
+        self._column_types = column_types
+        try:
+            tree = ast.parse(expression.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(
+                "Invalid filter expression '%s': %s" % (expression, e.msg)
+            )
+        self._evaluate, kind, _ = self._compile(tree.body)
+        if kind != 'bool':
+            raise ValueError(
+                "Filter expression '%s' doesn't evaluate to True or False "
+                "for each row" % expression
+            )
+
+    def evaluate(self, get_column):
+        """
+        Evaluate the expression, getting the values of the columns that it
+        refers to by calling ``get_column`` with their names.
+        """
+        try:
+            return np.asarray(self._evaluate(get_column), dtype=bool)
+        except TypeError as e:
+            raise ValueError(
+                "Couldn't evaluate filter expression '%s': %s" %
+                (self.expression, e)
+            )
+
+    def _compile(self, node):
+        # returns the function that evaluates the node, the kind of value
+        # it produces, and whether it's a constant
+        try:
+            value = ast.literal_eval(node)
+        except (ValueError, TypeError, SyntaxError):
+            pass
+        else:
+            return (lambda get_column: value), self._constant_kind(value), \
+                True
+
+        if isinstance(node, ast.Name):
+            return self._compile_column(node.id)
+        if isinstance(node, ast.BoolOp):
+            return self._compile_bool_op(node), 'bool', False
+        if isinstance(node, ast.Compare):
+            masks = []
+            left = node.left
+            for op, right in zip(node.ops, node.comparators):
+                masks.append(self._compile_comparison(left, op, right))
+                left = right
+            return self._combine(masks, np.logical_and), 'bool', False
+        if isinstance(node, ast.UnaryOp):
+            return self._compile_unary_op(node)
+        if isinstance(node, ast.BinOp):
+            return self._compile_bin_op(node)
+        raise ValueError(
+            "Unsupported syntax in filter expression '%s'" % self.expression
+        )
+
+    def _compile_column(self, col_name):
+        if col_name not in self._column_types:
+            raise ValueError(
+                "Unknown column '%s' in filter expression" % col_name
+            )
+        self.columns.add(col_name)
+        kind = self._kinds.get(self._column_types[col_name], 'other')
+
+        def get_values(get_column):
+            return np.asarray(get_column(col_name))
+        return get_values, kind, False
+
+    def _compile_bool_op(self, node):
+        masks = []
+        for value in node.values:
+            fn, kind, _ = self._compile(value)
+            if kind != 'bool':
+                raise ValueError(
+                    "The operands of 'and' and 'or' must be True or False "
+                    "for each row, in filter expression '%s'" %
+                    self.expression
+                )
+            masks.append(fn)
+        if isinstance(node.op, ast.And):
+            return self._combine(masks, np.logical_and)
+        return self._combine(masks, np.logical_or)
+
+    def _compile_unary_op(self, node):
+        fn, kind, is_constant = self._compile(node.operand)
+        if isinstance(node.op, ast.Not) and kind == 'bool':
+            return (lambda get_column: np.logical_not(fn(get_column))), \
+                'bool', is_constant
+        if isinstance(node.op, ast.USub) and kind in ('number', 'bool'):
+            return (lambda get_column: -fn(get_column)), 'number', \
+                is_constant
+        raise ValueError(
+            "Unsupported use of a unary operator in filter expression '%s'" %
+            self.expression
+        )
+
+    def _compile_bin_op(self, node):
+        op = self._arithmetic.get(type(node.op))
+        left, left_kind, _ = self._compile(node.left)
+        right, right_kind, _ = self._compile(node.right)
+        if op is None or left_kind not in ('number', 'bool') or \
+                right_kind not in ('number', 'bool'):
+            raise ValueError(
+                "Arithmetic is only supported on numbers, in filter "
+                "expression '%s'" % self.expression
+            )
+        return (lambda get_column: op(left(get_column), right(get_column))), \
+            'number', False
+
+    def _compile_comparison(self, left_node, op, right_node):
+        left, left_kind, left_is_constant = self._compile(left_node)
+        if left_is_constant and type(op) in self._reflected:
+            # turn comparisons like '100 < price' into 'price > 100'
+            left_node, right_node = right_node, left_node
+            op = self._reflected[type(op)]()
+            left, left_kind, left_is_constant = self._compile(left_node)
+        if left_is_constant:
+            raise ValueError(
+                "The left side of a comparison must refer to a column, in "
+                "filter expression '%s'" % self.expression
+            )
+
+        if isinstance(op, (ast.In, ast.NotIn)):
+            try:
+                values = ast.literal_eval(right_node)
+            except (ValueError, TypeError, SyntaxError):
+                values = None
+            if not isinstance(values, (tuple, list, set, frozenset)):
+                raise ValueError(
+                    "The right side of 'in' must be a list of constants, in "
+                    "filter expression '%s'" % self.expression
+                )
+            values = [self._coerce_constant(left_kind, v) for v in values]
+            exclude = isinstance(op, ast.NotIn)
+
+            def is_in(get_column):
+                mask = pd.Series(left(get_column)).isin(values).values
+                if exclude:
+                    np.logical_not(mask, out=mask)
+                return mask
+            return is_in
+
+        compare = self._comparisons.get(type(op))
+        if compare is None:
+            raise ValueError(
+                "Unsupported comparison in filter expression '%s'" %
+                self.expression
+            )
+        right, right_kind, right_is_constant = self._compile(right_node)
+        if right_is_constant:
+            value = self._coerce_constant(left_kind, right(None))
+            return lambda get_column: compare(left(get_column), value)
+        if 'other' not in (left_kind, right_kind) and \
+                (left_kind == 'datetime') != (right_kind == 'datetime'):
+            raise ValueError(
+                "Can't compare dates with numbers, in filter expression "
+                "'%s'" % self.expression
+            )
+        return lambda get_column: compare(left(get_column), right(get_column))
+
+    def _coerce_constant(self, kind, value):
+        # check that a constant can be compared with a column of the given
+        # kind, and convert it to a type that can be compared with it
+        if value is None or kind == 'other':
+            return value
+        if kind == 'datetime':
+            if isinstance(value, Number):
+                raise ValueError(
+                    "Can't compare dates with %r, in filter expression '%s'" %
+                    (value, self.expression)
+                )
+            try:
+                return pd.Timestamp(value)
+            except ValueError:
+                raise ValueError(
+                    "%r isn't a valid date, in filter expression '%s'" %
+                    (value, self.expression)
+                )
+        if not isinstance(value, Number):
+            raise ValueError(
+                "Can't compare numbers with %r, in filter expression '%s'" %
+                (value, self.expression)
+            )
+        return value
+
+    @staticmethod
+    def _constant_kind(value):
+        if isinstance(value, bool):
+            return 'bool'
+        if isinstance(value, Number):
+            return 'number'
+        return 'other'
+
+    @staticmethod
+    def _combine(masks, logical_op):
+        # evaluates the first mask into a new array, and then combines the
+        # rest of the masks with it in place
+        def evaluate(get_column):
+            mask = np.array(masks[0](get_column), dtype=bool)
+            for fn in masks[1:]:
+                logical_op(mask, fn(get_column), out=mask)
+            return mask
+        return evaluate
+
+
+class _EditJournal(object):
+    """
+    A record of the edits made to a grid, which lets them be undone and
+    redone.  Each entry holds just enough to reverse one operation, in
+    columnar form.  Cells are identified by the ``qgrid_unfiltered_index``
+    of their row (which, unlike a row's position in the view, doesn't change
+    when the grid is sorted or filtered) and a code for their column, which
+    is the column's position in ``columns``.  Operations that change many
+    cells or rows at once are recorded as a single entry.
+
+    There are three kinds of entries:
+
+    * ``edit``: ``ids``, ``columns``, ``old`` and ``new`` arrays with one
+      item per edited cell.
+    * ``add``: the ``ids`` of rows that were added.
+    * ``remove``: the removed ``rows`` themselves, their ``positions`` in
+      the unfiltered DataFrame, and their ``view_ids`` and
+      ``view_positions`` in the view they were removed from.
+
+    Once the entries hold more than ``max_cells`` cells in total, the oldest
+    ones are discarded.
+    """
+
+    def __init__(self, max_cells):
+        self.max_cells = max_cells
+        self.columns = []
+        self.undo_entries = deque()
+        self.redo_entries = deque()
+        self._column_codes = {}
+        self._cells = 0
+
+    def column_codes(self, col_names):
+        codes = np.empty(len(col_names), dtype=np.int32)
+        for i, col_name in enumerate(col_names):
+            code = self._column_codes.get(col_name)
+            if code is None:
+                code = self._column_codes[col_name] = len(self.columns)
+                self.columns.append(col_name)
+            codes[i] = code
+        return codes
+
+    def column_names(self, codes):
+        return np.asarray(self.columns, dtype=object)[codes]
+
+    def record(self, entry):
+        # a new edit means the edits that were undone can't be redone
+        while len(self.redo_entries) > 0:
+            self._cells -= self.redo_entries.pop()['cells']
+        self.push(self.undo_entries, entry)
+
+    def push(self, entries, entry):
+        entries.append(entry)
+        self._cells += entry['cells']
+        for oldest in (self.undo_entries, self.redo_entries):
+            while self._cells > self.max_cells and len(oldest) > 0:
+                self._cells -= oldest.popleft()['cells']
+
+    def pop(self, entries):
+        entry = entries.pop()
+        self._cells -= entry['cells']
+        return entry
+
+
+class _EditTracker(object):
+    """
+    Keeps track of the edits made to a grid since a checkpoint, so that
+    they can be exported without comparing the whole DataFrame with its
+    original.  Rows that existed at the checkpoint are those whose
+    ``qgrid_unfiltered_index`` is below ``next_id`` and which are marked in
+    ``present``; any row with a higher id was added since.  Edited cells
+    are recorded with the values they had before their first edit, and
+    removed rows with their indices, in chunks of arrays (one per
+    operation).  Whether a cell or row is still changed is only worked out
+    when the edits are exported, so edits that are undone drop out then.
+    """
+
+    def __init__(self, unfiltered_positions):
+        self.next_id = len(unfiltered_positions)
+        self.present = unfiltered_positions >= 0
+        self.edited = {}
+        self.removed = []
+
+    def track_edit(self, ids, columns, old_values):
+        for col_name in pd.unique(columns):
+            is_col = np.flatnonzero(columns == col_name)
+            is_col = is_col[ids[is_col] < self.next_id]
+            self.edited.setdefault(col_name, []).append(
+                (ids[is_col], old_values[is_col])
+            )
+
+    def track_removal(self, ids, indices):
+        existed = ids < self.next_id
+        self.removed.append((ids[existed], indices[existed]))
+
+
+class _ListenerExecutor(object):
+    """
+    Calls event listeners on a fixed number of worker threads, so that a
+    slow listener doesn't hold up the handling of messages from the
+    browser.  At most ``max_pending`` calls can be waiting for a worker, and
+    calls beyond that are dropped.  When there's a ``timeout``, calls which
+    have waited longer than that by the time a worker gets to them are
+    dropped too, and calls that are still running after that long are
+    logged (although they can't be stopped).  Exceptions raised by
+    listeners are logged rather than propagated, so a failing listener
+    doesn't affect the others.
+    """
+
+    def __init__(self, max_workers, max_pending, timeout):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._queue = queue.Queue(max_pending)
+        self._workers = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, listener, event, qgrid_widget):
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+        try:
+            self._queue.put_nowait((listener, event, qgrid_widget, deadline))
+        except queue.Full:
+            qgrid_widget.log.warning(
+                "Dropped the %s event for listener %r, because too many "
+                "listener calls are waiting to run" % (event['name'], listener)
+            )
+            return
+
+        with self._lock:
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(target=self._work)
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def shutdown(self):
+        # calls that are still waiting are dropped
+        self._shutdown = True
+        for _ in self._workers:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def _work(self):
+        while True:
+            task = self._queue.get()
+            if task is None or self._shutdown:
+                return
+            listener, event, qgrid_widget, deadline = task
+            if deadline is not None and time.time() > deadline:
+                qgrid_widget.log.warning(
+                    "Dropped the %s event for listener %r, because it "
+                    "waited longer than %s seconds to run" %
+                    (event['name'], listener, self.timeout)
+                )
+                continue
+
+            timer = None
+            if self.timeout is not None:
+                timer = threading.Timer(
+                    self.timeout, qgrid_widget.log.warning,
+                    args=("Listener %r has been handling the %s event for "
+                          "longer than %s seconds" %
+                          (listener, event['name'], self.timeout),)
+                )
+                timer.daemon = True
+                timer.start()
+            try:
+                listener(event, qgrid_widget)
+            except Exception:
+                qgrid_widget.log.exception(
+                    "Unhandled exception in listener %r for the %s event" %
+                    (listener, event['name'])
+                )
+            finally:
+                if timer is not None:
+                    timer.cancel()
+
+
 class _EventHandlers(object):
 
     def __init__(self):
@@ -121,16 +743,28 @@ class _EventHandlers(object):
             except KeyError:
                 pass
 
+    def has_listeners(self, name):
+        return len(self._listeners.get(name, [])) > 0 or \
+            len(self._listeners.get(All, [])) > 0
+
     def notify_listeners(self, event, qgrid_widget):
         event_listeners = self._listeners.get(event['name'], [])
         all_listeners = self._listeners.get(All, [])
+        executor = _listener_executor
         for c in chain(event_listeners, all_listeners):
-            c(event, qgrid_widget)
+            if executor is None:
+                c(event, qgrid_widget)
+            else:
+                executor.submit(c, event, qgrid_widget)
 
 
 defaults = _DefaultSettings()
 handlers = _EventHandlers()
 
+# when set (by set_event_dispatch), listeners are called by this executor
+# instead of being called synchronously
+_listener_executor = None
+
 
 def set_defaults(show_toolbar=None,
                  precision=None,
@@ -205,9 +839,11 @@ def on(names, handler):
         [
             'instance_created',
             'cell_edited',
+            'cells_edited',
             'selection_changed',
             'viewport_changed',
             'row_added',
+            'rows_added',
             'row_removed',
             'filter_dropdown_shown',
             'filter_changed',
@@ -225,6 +861,9 @@ def on(names, handler):
         listened for via either ``on`` method.
     off:
         Unhook a handler that was hooked up using this ``on`` method.
+    set_event_dispatch:
+        Have handlers called on background threads instead of
+        synchronously.
 
     """
     handlers.on(names, handler)
@@ -251,6 +890,55 @@ def off(names, handler):
     handlers.off(names, handler)
 
 
+def set_event_dispatch(mode, max_workers=4, max_pending=1000, timeout=None):
+    """
+    Choose how event listeners (registered with ``on``, either at the module
+    level or on a QgridWidget instance) are called.
+
+    By default listeners are called synchronously, in the order the events
+    occur, before qgrid goes on to handle the next message from the browser.
+    That means a slow listener (e.g. a ``viewport_changed`` listener that
+    queries a database) holds up scrolling and every other interaction with
+    the grid.  In ``async`` mode listeners are called on a bounded pool of
+    background threads instead, so qgrid carries on handling messages while
+    they run.
+
+    Parameters
+    ----------
+    mode : str
+        Either ``sync`` (the default behavior) or ``async``.
+    max_workers : int (default: 4)
+        The number of threads that call listeners in ``async`` mode.
+    max_pending : int (default: 1000)
+        The number of listener calls that can be waiting for a thread in
+        ``async`` mode.  Calls beyond that are dropped, and a warning is
+        logged.
+    timeout : float (default: None)
+        In ``async`` mode, the number of seconds a listener call can wait
+        for a thread before it's dropped, and after which a warning is
+        logged if it's still running.  None means there's no limit.
+
+    Notes
+    -----
+    In ``async`` mode listeners may be called from several threads at
+    once, and in a different order to the one in which the events occurred,
+    so users who rely on that order should stay with ``sync`` mode.  An
+    exception raised by a listener is logged instead of being raised.
+    Listener calls that are still waiting when the mode is changed are
+    dropped.
+    """
+    global _listener_executor
+    if mode not in ('sync', 'async'):
+        raise ValueError("mode must be 'sync' or 'async', not %r" % (mode,))
+    if _listener_executor is not None:
+        _listener_executor.shutdown()
+    if mode == 'async':
+        _listener_executor = _ListenerExecutor(max_workers, max_pending,
+                                               timeout)
+    else:
+        _listener_executor = None
+
+
 def set_grid_option(optname, optvalue):
     """
     Set the default value for one of the options that gets passed into the
@@ -513,6 +1201,34 @@ def show_grid(data_frame,
 
 PAGE_SIZE = 100
 
+# sorting and filtering frames with at least this many rows happens on a
+# worker thread, so the kernel can keep handling messages in the meantime
+BACKGROUND_MIN_ROWS = 1000000
+
+# sorts of views with at least this many rows only sort the rows needed to
+# render the current viewport up front, and finish sorting in the background
+LAZY_SORT_MIN_ROWS = 1000000
+
+# the number of bins in the histograms shown in slider and date filters
+HISTOGRAM_BINS = 40
+
+# the total number of cells that the undo/redo journal keeps old and new
+# values for before it starts discarding the oldest edits
+UNDO_MAX_CELLS = 1000000
+
+# the default for arguments where None has a meaning of its own, such as the
+# sort argument of set_state, for which None clears the sort
+_UNCHANGED = object()
+
+
+def _get_running_loop():
+    # the event loop of the current thread (the kernel's, when called while
+    # handling a message), which other threads can hand work back to
+    try:
+        return asyncio.get_running_loop()
+    except (RuntimeError, AttributeError):
+        return None
+
 
 def stringify(x):
     if isinstance(x, string_types):
@@ -521,6 +1237,96 @@ def stringify(x):
         return str(x)
 
 
+def _sort_type_rank(x):
+    if isinstance(x, (Number, np.number, np.bool_)):
+        return 0
+    if isinstance(x, (date, np.datetime64)):
+        return 1
+    if isinstance(x, (string_types, bytes)):
+        return 2
+    return 3
+
+
+def _typed_argsort(values):
+    """
+    Argsort values that can't all be compared with each other, such as a
+    mix of numbers and strings, by ordering on (type rank, value) pairs.
+    Values of types that can't be ordered at all are ordered by type name
+    and then by their string representation.
+    """
+    values = np.asarray(values, dtype=object)
+    type_ranks = np.array([_sort_type_rank(x) for x in values],
+                          dtype=np.int64)
+    value_ranks = np.empty(len(values), dtype=np.int64)
+    for type_rank in np.unique(type_ranks):
+        positions = np.flatnonzero(type_ranks == type_rank)
+        group = values[positions]
+        try:
+            group_order = group.argsort(kind='mergesort')
+        except TypeError:
+            group_order = sorted(
+                range(len(group)),
+                key=lambda i: (type(group[i]).__name__, stringify(group[i]))
+            )
+        value_ranks[positions[group_order]] = np.arange(len(group))
+    return np.lexsort((value_ranks, type_ranks))
+
+
+def _normalize_ranges(ranges, length=None):
+    """
+    Turn a list of ``[start, end)`` row ranges into a sorted array of
+    non-overlapping, non-adjacent ranges with shape ``(n, 2)``, optionally
+    clipping them to ``length`` rows.  Empty ranges are dropped.
+    """
+    ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+    if length is not None:
+        ranges = np.clip(ranges, 0, length)
+    ranges = ranges[ranges[:, 0] < ranges[:, 1]]
+    if len(ranges) == 0:
+        return ranges
+    ranges = ranges[np.argsort(ranges[:, 0], kind='mergesort')]
+    ends = np.maximum.accumulate(ranges[:, 1])
+    # a range is merged into the ones before it if it overlaps or touches them
+    is_first = np.ones(len(ranges), dtype=bool)
+    is_first[1:] = ranges[1:, 0] > ends[:-1]
+    first = np.flatnonzero(is_first)
+    last = np.append(first[1:], len(ranges)) - 1
+    return np.column_stack([ranges[first, 0], ends[last]])
+
+
+def _rows_to_ranges(rows):
+    # the runs of consecutive positions in a list of row positions
+    rows = np.unique(np.asarray(rows, dtype=np.int64))
+    if len(rows) == 0:
+        return np.empty((0, 2), dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    starts = rows[np.append(0, breaks)]
+    ends = rows[np.append(breaks - 1, len(rows) - 1)] + 1
+    return np.column_stack([starts, ends])
+
+
+def _ranges_to_rows(ranges):
+    lengths = ranges[:, 1] - ranges[:, 0]
+    offsets = ranges[:, 0] - (np.cumsum(lengths) - lengths)
+    return np.arange(lengths.sum()) + np.repeat(offsets, lengths)
+
+
+def _as_index(labels):
+    # a list of index labels as an Index, which is a MultiIndex when the
+    # labels are tuples, so it can be looked up in a DataFrame's index
+    if isinstance(labels, pd.Index):
+        return labels
+    return pd.Index(list(labels), tupleize_cols=True)
+
+
+def _ranges_to_mask(ranges, length):
+    # ranges are normalized, so no two of them start or end at the same row
+    change = np.zeros(length + 1, dtype=np.int8)
+    change[ranges[:, 0]] += 1
+    change[ranges[:, 1]] -= 1
+    return np.cumsum(change[:-1]) > 0
+
+
 @widgets.register()
 class QgridWidget(widgets.DOMWidget):
     """
@@ -590,7 +1396,8 @@ class QgridWidget(widgets.DOMWidget):
     _sort_col_suffix = Unicode('_qgrid_sort_column')
     _multi_index = Bool(False, sync=True)
     _edited = Bool(False)
-    _selected_rows = List([])
+    _selection_ranges = Instance(np.ndarray, args=((0, 2),),
+                                 kw={'dtype': np.int64})
     _viewport_range = Tuple(Integer(),
                             Integer(),
                             default_value=(0, 100),
@@ -599,6 +1406,26 @@ class QgridWidget(widgets.DOMWidget):
     _row_count = Integer(0, sync=True)
     _sort_field = Any(None, sync=True)
     _sort_ascending = Bool(True, sync=True)
+    _sort_columns = List([], sync=True)
+    _sort_key_cache = Dict({})
+    _filter_masks = Dict({})
+    _value_index_cache = Dict({})
+    _filter_values_cache = Dict({})
+    _search_index_cache = Dict({})
+    _filter_table_positions = Dict({})
+    _value_counts_cache = Dict({})
+    _range_index_cache = Dict({})
+    _range_summary_cache = Dict({})
+    _view_generation = Integer(0)
+    _unfiltered_positions = Instance(np.ndarray, allow_none=True)
+    _pending_sort = Instance(_PendingSort, allow_none=True)
+    _view_token = Instance(_CancellationToken, allow_none=True)
+    _view_events = List([])
+    _filters_changed = Bool(False)
+    _filter_expression = Instance(_FilterExpression, allow_none=True)
+    _filter_expression_text = Unicode('', sync=True)
+    _journal = Instance(_EditJournal, allow_none=True)
+    _edit_tracker = Instance(_EditTracker, allow_none=True)
     _handlers = Instance(_EventHandlers)
 
     df = Instance(pd.DataFrame)
@@ -613,6 +1440,12 @@ class QgridWidget(widgets.DOMWidget):
     def __init__(self, *args, **kwargs):
         self.id = str(uuid4())
         self._initialized = False
+        self._sort_lock = threading.Lock()
+        self._view_lock = threading.Lock()
+        self._view_state_lock = threading.Lock()
+        self._view_thread = None
+        self._view_result = None
+        self._df_json_patched = False
         super(QgridWidget, self).__init__(*args, **kwargs)
         # register a callback for custom messages
         self.on_msg(self._handle_qgrid_msg)
@@ -661,9 +1494,11 @@ class QgridWidget(widgets.DOMWidget):
 
             [
                 'cell_edited',
+                'cells_edited',
                 'selection_changed',
                 'viewport_changed',
                 'row_added',
+                'rows_added',
                 'row_removed',
                 'filter_dropdown_shown',
                 'filter_changed',
@@ -684,10 +1519,28 @@ class QgridWidget(widgets.DOMWidget):
             * **old** The previous value of the cell.
             * **new** The new value of the cell.
 
+        * **cells_edited** Multiple cells were edited at once, by pasting
+          or filling down in the grid or with the ``edit_cells`` method, or
+          an edit was undone or redone.  Each key
+          (apart from ``source``) holds an array with one entry per edited
+          cell.
+
+            * **index** The indices of the rows that contain the edited cells.
+            * **column** The names of the columns that contain the edited
+              cells.
+            * **old** The previous values of the cells.
+            * **new** The new values of the cells.
+            * **source** The source of this event.  Possible values are
+              ``api`` (the ``edit_cells`` method), ``gui`` (the grid
+              interface), and ``undo`` and ``redo`` (an edit being undone or
+              redone).
+
         * **filter_changed** The user changed the filter setting for a column.
 
             * **column** The name of the column for which the filter setting
-              was changed.
+              was changed, or None if the filter expression was changed.
+            * **expression** The new filter expression (only included when
+              the filter expression was changed).
 
         * **filter_dropdown_shown** The user showed the filter control for a
           column by clicking the filter icon in the column's header.
@@ -702,7 +1555,7 @@ class QgridWidget(widgets.DOMWidget):
             * **triggered_by** The name of the event that resulted in
               rows of data being sent down to the browser.  Possible values
               are ``change_viewport``, ``change_filter``, ``change_sort``,
-              ``add_row``, ``remove_row``, and ``edit_cell``.
+              ``set_state``, ``add_row``, ``remove_row``, and ``edit_cell``.
             * **range** A tuple specifying the range of rows that have been
               sent down to the browser.
 
@@ -713,13 +1566,23 @@ class QgridWidget(widgets.DOMWidget):
             * **source** The source of this event.  Possible values are
               ``api`` (an api method call) and ``gui`` (the grid interface).
 
+        * **rows_added** Multiple rows were added at once, using the
+          ``add_rows`` method.
+
+            * **indices** The indices of the newly added rows.
+            * **source** The source of this event.  Possible values are
+              ``api`` (the ``add_rows`` method), and ``undo`` and ``redo``
+              (a removal of rows being undone, or an addition being redone).
+
         * **row_removed** The user added removed one or more rows using the
           "Remove Row" button in the grid toolbar.
 
             * **indices** The indices of the removed rows, specified as an
               array of integers.
             * **source** The source of this event.  Possible values are
-              ``api`` (an api method call) and ``gui`` (the grid interface).
+              ``api`` (an api method call), ``gui`` (the grid interface),
+              and ``undo`` and ``redo`` (an addition of rows being undone,
+              or a removal being redone).
 
         * **selection_changed** The user changed which rows were highlighted
           in the grid.
@@ -806,6 +1669,10 @@ class QgridWidget(widgets.DOMWidget):
 
     def _update_df(self):
         self._ignore_df_changed = True
+        if self._view_token is not None:
+            self._view_token.cancel()
+        self._wait_for_view()
+        self._cancel_pending_sort()
         # make a copy of the user's dataframe
         self._df = self.df.copy()
 
@@ -816,6 +1683,13 @@ class QgridWidget(widgets.DOMWidget):
         # keep an unfiltered version to serve as the starting point
         # for filters, and the state we return to when filters are removed
         self._unfiltered_df = self._df.copy()
+        self._unfiltered_positions = None
+        self._update_unfiltered_positions()
+        self._journal = _EditJournal(UNDO_MAX_CELLS)
+        self._edit_tracker = _EditTracker(self._unfiltered_positions)
+        self._filter_expression = None
+        self._filter_expression_text = ''
+        self._clear_column_caches()
 
         self._update_table(update_columns=True, fire_data_change_event=False)
         self._ignore_df_changed = False
@@ -850,8 +1724,6 @@ class QgridWidget(widgets.DOMWidget):
                       triggered_by=None,
                       scroll_to_row=None,
                       fire_data_change_event=True):
-        df = self._df.copy()
-
         from_index = max(self._viewport_range[0] - PAGE_SIZE, 0)
         to_index = max(self._viewport_range[0] + PAGE_SIZE, 0)
         new_df_range = (from_index, to_index)
@@ -862,7 +1734,18 @@ class QgridWidget(widgets.DOMWidget):
 
         self._df_range = new_df_range
 
-        df = df.iloc[from_index:to_index]
+        # while a lazy sort is pending, rows can be served from its top-k
+        # positions until the user scrolls past them
+        with self._sort_lock:
+            pending = self._pending_sort
+        if pending is not None and to_index > len(pending.top):
+            self._finish_pending_sort()
+            pending = None
+
+        if pending is not None:
+            df = self._df.take(pending.top[from_index:to_index])
+        else:
+            df = self._df.iloc[from_index:to_index].copy()
 
         self._row_count = len(self._df.index)
 
@@ -1042,7 +1925,12 @@ class QgridWidget(widgets.DOMWidget):
                                       date_format='iso',
                                       double_precision=self.precision)
 
+        if self._df_json_patched and df_json == self._df_json:
+            # the browser's copy has been patched since _df_json was last
+            # set, so it differs even though this value doesn't
+            self.send_state('_df_json')
         self._df_json = df_json
+        self._df_json_patched = False
 
         if self.row_edit_callback is not None:
             editable_rows = {}
@@ -1066,50 +1954,331 @@ class QgridWidget(widgets.DOMWidget):
                 data_to_send['scroll_to_row'] = scroll_to_row
             self.send(data_to_send)
 
-    def _update_sort(self):
-        try:
-            if self._sort_field is None:
+    def _patch_cells(self, view_positions, columns):
+        """
+        Send the new values of edited cells to the browser, given the
+        positions of their rows in ``_df`` (-1 for rows that aren't in the
+        view) and the names of their columns.  Edits don't change which rows
+        are in the view or their order, so rather than sending the whole
+        window of rows again, a ``patch_cells`` message is sent with the
+        cells that are in the window, which lets the browser redraw just
+        those rows.  The browser applies the patch to its copy of
+        ``_df_json`` as well, so that views which are rendered from it later
+        show the new values, and ``_df_json`` itself is brought up to date
+        the next time the window is rendered.  Fires a ``json_updated``
+        event in the same way as ``_update_table``.
+        """
+        if self.row_edit_callback is not None:
+            # whether a row is editable may depend on the edited values
+            self._update_table(triggered_by='edit_cell',
+                               fire_data_change_event=True)
+            return
+
+        from_index, to_index = self._df_range
+        in_window = np.flatnonzero((view_positions >= from_index) &
+                                   (view_positions < to_index))
+        cells = []
+        if len(in_window) > 0:
+            rows, row_codes = np.unique(view_positions[in_window],
+                                        return_inverse=True)
+            patched_columns = list(pd.unique(columns[in_window]))
+            df = self._df.iloc[rows][patched_columns].copy()
+            for col_name in patched_columns:
+                sort_column_name = self._sort_helper_columns.get(col_name)
+                if sort_column_name:
+                    df[col_name] = \
+                        self._df[sort_column_name].values[rows]
+                elif col_name in self._interval_columns:
+                    df[col_name] = df[col_name].map(lambda x: str(x))
+                elif col_name in self._string_columns:
+                    df[col_name] = df[col_name].map(stringify)
+
+            # the values are serialized in the same way as the rows that
+            # are sent by _update_table
+            parsed_json = json.loads(pd_json.to_json(
+                None, df, orient='table', date_format='iso',
+                double_precision=self.precision
+            ))
+            fields = [field['name'] for field in
+                      parsed_json['schema']['fields'][-len(patched_columns):]]
+            field_names = dict(zip(patched_columns, fields))
+            data = parsed_json['data']
+            for i, row_code in zip(in_window, row_codes):
+                field = field_names[columns[i]]
+                cells.append([int(rows[row_code]), field,
+                              data[row_code][field]])
+
+            # the browser patches its copy of _df_json, which saves sending
+            # the whole window again for every edit
+            self._df_json_patched = True
+
+        self._notify_listeners({
+            'name': 'json_updated',
+            'triggered_by': 'edit_cell',
+            'range': self._df_range
+        })
+        self.send({
+            'type': 'patch_cells',
+            'cells': cells
+        })
+
+    def _update_sort(self, token=None):
+        self._set_sorted_view(*self._sort_view(self._df, token))
+
+    def _sort_view(self, df, token=None):
+        """
+        Sort the rows of a view by the current sort columns, without
+        changing the current view, so that it can be done on a worker
+        thread.  Returns a tuple of ``(df, keys, top)`` to pass to
+        ``_set_sorted_view``, where ``keys`` and ``top`` are None unless
+        only the ``top`` rows have been sorted, in which case ``df`` is
+        still unsorted and the rest of the sort is left to a lazy sort.
+        """
+        if len(self._sort_columns) == 0:
+            return df, None, None
+        token = token or _CancellationToken()
+
+        sort_columns = [(col_name, ascending)
+                        for col_name, ascending in self._sort_columns]
+
+        # when sorting by an index level, the remaining levels are used to
+        # break ties, which matches the behavior of 'sort_index'
+        index_sorts = [sort for sort in sort_columns
+                       if sort[0] in self._primary_key]
+        if len(index_sorts) > 0:
+            sorted_names = set(col_name for col_name, _ in sort_columns)
+            for col_name in self._primary_key:
+                if col_name not in sorted_names:
+                    sort_columns.append((col_name, index_sorts[0][1]))
+
+        # np.lexsort treats the last key as the primary one, so the keys
+        # are gathered in reverse order of precedence
+        view_positions = self._get_view_positions(df)
+        keys = []
+        radixes = []
+        for col_name, ascending in reversed(sort_columns):
+            token.check()
+            codes, sorted_uniques = self._get_sort_key(col_name)
+            n_codes = len(sorted_uniques)
+            keys.append(self._directed_sort_key(codes[view_positions],
+                                                n_codes,
+                                                ascending))
+            radixes.append(n_codes + 1)
+
+        token.check(progress=0.75)
+        top_k = self._viewport_range[1] + PAGE_SIZE
+        if len(df) >= LAZY_SORT_MIN_ROWS and top_k < len(df):
+            top = self._top_k_positions(keys, radixes, top_k)
+            if top is not None:
+                token.check()
+                return df, keys, top
+
+        order = np.lexsort(keys)
+        token.check()
+        return df.take(order), None, None
+
+    def _set_sorted_view(self, df, keys, top):
+        # make the result of _sort_view the current view
+        self._cancel_pending_sort()
+        self._df = df
+        if len(self._sort_columns) > 0:
+            self._disable_grouping = \
+                self._sort_columns[0][0] != self._primary_key[0]
+        if top is not None:
+            self._start_pending_sort(keys, top)
+
+    @staticmethod
+    def _top_k_positions(keys, radixes, k):
+        """
+        Get the positions of the first ``k`` rows of the stable sort by
+        ``keys`` using a partial sort, which is O(n) instead of O(n log n).
+        Returns None if the keys can't be combined into a single int64.
+        """
+        if np.prod(np.array(radixes, dtype=np.float64)) >= 2 ** 62:
+            return None
+
+        composite = np.zeros(len(keys[0]), dtype=np.int64)
+        for key, radix in zip(reversed(keys), reversed(radixes)):
+            composite *= radix
+            composite += key
+
+        # everything up to and including the k-th smallest value is a
+        # candidate; sorting the candidates stably (they're already in
+        # position order) breaks ties exactly as np.lexsort would
+        threshold = np.partition(composite, k - 1)[k - 1]
+        candidates = np.flatnonzero(composite <= threshold)
+        order = np.argsort(composite[candidates], kind='mergesort')
+        return candidates[order[:k]]
+
+    def _start_pending_sort(self, keys, top):
+        pending = _PendingSort(keys, top)
+        pending.thread = threading.Thread(target=self._run_pending_sort,
+                                          args=(pending, _get_running_loop()))
+        pending.thread.daemon = True
+        with self._sort_lock:
+            self._pending_sort = pending
+        pending.thread.start()
+
+    def _run_pending_sort(self, pending, loop):
+        # np.lexsort releases the GIL, so the kernel stays responsive.  the
+        # sorted rows are swapped in on the kernel's thread, or without an
+        # event loop to hand them to, by _finish_pending_sort or when the
+        # next message arrives
+        pending.order = np.lexsort(pending.keys)
+        if loop is not None:
+            loop.call_soon_threadsafe(self._swap_pending_sort, pending)
+
+    def _swap_pending_sort(self, pending=None):
+        """
+        Make the rows sorted by a lazy sort the current view, if its full
+        permutation has been computed and no newer view has replaced it.
+        The rows of ``_df`` are taken in the sorted order, rather than those
+        of a copy made when the sort started, so that columns which were
+        added to ``_df`` since are kept.  Must be called on the kernel's
+        thread.
+        """
+        with self._sort_lock:
+            if pending is None:
+                pending = self._pending_sort
+            if pending is None or pending is not self._pending_sort or \
+                    pending.order is None:
                 return
-            self._disable_grouping = False
-            if self._sort_field in self._primary_key:
-                if len(self._primary_key) == 1:
-                    self._df.sort_index(
-                        ascending=self._sort_ascending,
-                        inplace=True
-                    )
-                else:
-                    level_index = self._primary_key.index(self._sort_field)
-                    self._df.sort_index(
-                        level=level_index,
-                        ascending=self._sort_ascending,
-                        inplace=True
-                    )
-                    if level_index > 0:
-                        self._disable_grouping = True
-            else:
-                self._df.sort_values(
-                    self._sort_field,
-                    ascending=self._sort_ascending,
-                    inplace=True
-                )
-                self._disable_grouping = True
+            self._pending_sort = None
+        self._df = self._df.take(pending.order)
+
+    def _finish_pending_sort(self):
+        """
+        Wait for a pending lazy sort to be swapped in. Must be called before
+        anything that relies on the order of the rows in ``_df``.
+        """
+        pending = self._pending_sort
+        if pending is not None:
+            pending.thread.join()
+            self._swap_pending_sort(pending)
+
+    def _cancel_pending_sort(self):
+        with self._sort_lock:
+            self._pending_sort = None
+
+    @staticmethod
+    def _directed_sort_key(codes, n_codes, ascending):
+        # missing values (code -1) are placed last regardless of direction
+        if ascending:
+            key = codes.copy()
+        else:
+            key = (n_codes - 1) - codes
+        key[codes < 0] = n_codes
+        return key
+
+    def _get_sort_key(self, col_name):
+        """
+        Get the cached sort key for a column, which is a tuple of
+        ``(codes, sorted_uniques)`` where ``sorted_uniques`` holds the
+        column's distinct values in sorted order, and ``codes`` holds the
+        position in ``sorted_uniques`` of each row's value in
+        ``_unfiltered_df`` (-1 for missing values).  Keys are computed once
+        per column so that adding a secondary sort column reuses the ranks
+        that were already computed for the primary one.
+
+        Columns with values that can't be compared with each other, such as
+        a mix of numbers and strings, are ordered by (type, value) instead.
+        """
+        if col_name in self._sort_key_cache:
+            return self._sort_key_cache[col_name]
+
+        col_series = self._get_col_series_from_df(col_name,
+                                                  self._unfiltered_df)
+        codes, uniques = pd.factorize(col_series)
+        try:
+            order = uniques.argsort()
         except TypeError:
             self.log.info('TypeError occurred, assuming mixed data type '
                           'column')
-            # if there's a TypeError, assume it means that we have a mixed
-            # type column, and attempt to create a stringified version of
-            # the column to use for sorting/filtering
-            self._df.sort_values(
-                self._initialize_sort_column(self._sort_field),
-                ascending=self._sort_ascending,
-                inplace=True
-            )
+            order = _typed_argsort(uniques)
+
+        ranks = np.empty(len(order), dtype=np.int64)
+        ranks[order] = np.arange(len(order))
+        codes = np.asarray(codes)
+        has_value = codes >= 0
+        sorted_codes = np.full(len(codes), -1,
+                               dtype=np.int32 if len(order) < 2 ** 31
+                               else np.int64)
+        sorted_codes[has_value] = ranks[codes[has_value]]
+
+        sort_key = (sorted_codes, uniques.take(order))
+        self._sort_key_cache[col_name] = sort_key
+        return sort_key
+
+    def _get_view_positions(self, df=None):
+        # the positions in _unfiltered_df of each of the rows in _df (or in
+        # the given view)
+        if df is None:
+            df = self._df
+        return self._unfiltered_positions[
+            np.asarray(df[self._index_col_name], dtype=np.int64)
+        ]
 
-    # Add a new column which is a stringified version of the column whose name
-    # was passed in, which can be used for sorting and filtering (to avoid
-    # error caused by the type of data in the column, like having multiple
-    # data types in a single column).
-    def _initialize_sort_column(self, col_name, to_timestamp=False):
+    def _update_unfiltered_positions(self):
+        """
+        Rebuild the mapping from the ``qgrid_unfiltered_index`` of each row to
+        its position in ``_unfiltered_df`` (or -1 for rows that have been
+        removed), which lets rows be found without scanning that column.
+        Sorting and filtering don't move rows in ``_unfiltered_df``, so this
+        only needs to happen when rows are added or removed.  The mapping
+        never gets shorter, so the ids of removed rows aren't given to new
+        rows (which would confuse the edit journal if the removal is
+        undone).
+        """
+        ids = np.asarray(self._unfiltered_df[self._index_col_name],
+                         dtype=np.int64)
+        length = ids.max() + 1 if len(ids) > 0 else 0
+        if self._unfiltered_positions is not None:
+            length = max(length, len(self._unfiltered_positions))
+        positions = np.full(length, -1, dtype=np.int64)
+        positions[ids] = np.arange(len(ids))
+        self._unfiltered_positions = positions
+
+    def _clear_column_caches(self, col_names=None):
+        """
+        Discard values that were derived from the data in ``_unfiltered_df``,
+        either for the given columns or, if ``col_names`` is None, for all
+        columns.  Must be called whenever the underlying data changes.
+        """
+        if col_names is None:
+            self._sort_key_cache = {}
+            self._filter_masks = {}
+            self._value_index_cache = {}
+            self._filter_values_cache = {}
+            self._search_index_cache = {}
+            self._filter_table_positions = {}
+            self._value_counts_cache = {}
+            self._range_index_cache = {}
+            self._range_summary_cache = {}
+            self._sorted_column_cache = {}
+            if self._filter_expression is not None:
+                self._filter_expression.mask = None
+            return
+        # counts depend on the data in every column that has a filter, so
+        # they're discarded whenever any of the data changes
+        self._value_counts_cache = {}
+        if self._filter_expression is not None and \
+                self._filter_expression.columns.intersection(col_names):
+            self._filter_expression.mask = None
+        for col_name in col_names:
+            self._sort_key_cache.pop(col_name, None)
+            self._filter_masks.pop(col_name, None)
+            self._value_index_cache.pop(col_name, None)
+            self._filter_values_cache.pop(col_name, None)
+            self._search_index_cache.pop(col_name, None)
+            self._filter_table_positions.pop(col_name, None)
+            self._range_index_cache.pop(col_name, None)
+            self._range_summary_cache.pop(col_name, None)
+            self._sorted_column_cache.pop(col_name, None)
+
+    # Add a new column which is a timestamp version of the period column
+    # whose name was passed in, which is used for sorting, filtering and
+    # displaying the column (since period objects can't be shown directly).
+    def _initialize_sort_column(self, col_name):
         sort_column_name = self._sort_helper_columns.get(col_name)
         if sort_column_name:
             return sort_column_name
@@ -1120,16 +2289,12 @@ class QgridWidget(widgets.DOMWidget):
             self._get_col_series_from_df(col_name, self._unfiltered_df)
         sort_column_name = str(col_name) + self._sort_col_suffix
 
-        if to_timestamp:
-            self._df[sort_column_name] = sort_col_series.to_timestamp()
-            self._unfiltered_df[sort_column_name] = \
-                sort_col_series_unfiltered.to_timestamp()
-        else:
-            self._df[sort_column_name] = sort_col_series.map(str)
-            self._unfiltered_df[sort_column_name] = \
-                sort_col_series_unfiltered.map(str)
+        self._df[sort_column_name] = sort_col_series.to_timestamp()
+        self._unfiltered_df[sort_column_name] = \
+            sort_col_series_unfiltered.to_timestamp()
 
         self._sort_helper_columns[col_name] = sort_column_name
+        self._clear_column_caches([col_name])
         return sort_column_name
 
     def _handle_show_filter_dropdown(self, content):
@@ -1144,19 +2309,26 @@ class QgridWidget(widgets.DOMWidget):
         # same values, but converted to timestamps instead of period objects.
         # we'll use that sort column for all subsequent sorts/filters.
         if col_name in self._period_columns:
-            self._initialize_sort_column(col_name,
-                                         to_timestamp=True)
+            self._initialize_sort_column(col_name)
 
         col_series = self._get_col_series_from_df(col_name, df_for_unique)
         if 'is_index' in col_info:
             col_series = pd.Series(col_series)
 
+        if col_info['type'] in ['integer', 'number', 'datetime']:
+            # build the column's sorted index while the dropdown is opening,
+            # so that moving the range filter's handles is fast
+            self._get_range_index(col_name)
+
         if col_info['type'] in ['integer', 'number']:
             if 'filter_info' not in col_info or \
                     (col_info['filter_info']['min'] is None and
                      col_info['filter_info']['max'] is None):
-                col_info['slider_max'] = max(col_series)
-                col_info['slider_min'] = min(col_series)
+                min_value, max_value, histogram = \
+                    self._get_range_summary(col_name, df_for_unique)
+                col_info['slider_max'] = max_value
+                col_info['slider_min'] = min_value
+                col_info['histogram'] = histogram
                 self._columns[col_name] = col_info
             self.send({
                 'type': 'column_min_max_updated',
@@ -1168,8 +2340,11 @@ class QgridWidget(widgets.DOMWidget):
             if 'filter_info' not in col_info or \
                     (col_info['filter_info']['min'] is None and
                      col_info['filter_info']['max'] is None):
-                col_info['filter_max'] = max(col_series)
-                col_info['filter_min'] = min(col_series)
+                min_value, max_value, histogram = \
+                    self._get_range_summary(col_name, df_for_unique)
+                col_info['filter_max'] = max_value
+                col_info['filter_min'] = min_value
+                col_info['histogram'] = histogram
                 self._columns[col_name] = col_info
             self.send({
                 'type': 'column_min_max_updated',
@@ -1194,91 +2369,114 @@ class QgridWidget(widgets.DOMWidget):
             self.log.info('handled boolean type')
             return
         else:
+            filter_values = self._get_filter_values(col_name, col_series)
+            # values from the unfiltered rows stay valid until the data
+            # changes, while values from the filtered rows also depend on the
+            # filters on the other columns
+            if df_for_unique is self._unfiltered_df:
+                cache_key = None
+            else:
+                cache_key = self._get_view_filters_key(col_name)
+            cached = self._sorted_column_cache.get(col_name)
+
             if col_info['type'] == 'any':
-                unique_list = col_series.cat.categories
+                value_positions = np.arange(len(filter_values))
+            elif cached is not None and cached[0] == cache_key:
+                value_positions = cached[1]
             else:
-                if col_name in self._sorted_column_cache:
-                    unique_list = self._sorted_column_cache[col_name]
-                else:
-                    unique = col_series.unique()
-                    if len(unique) < 500000:
-                        try:
-                            unique.sort()
-                        except TypeError:
-                            sort_col_name = \
-                                self._initialize_sort_column(col_name)
-                            col_series = df_for_unique[sort_col_name]
-                            unique = col_series.unique()
-                            unique.sort()
-                    unique_list = unique.tolist()
-                    self._sorted_column_cache[col_name] = unique_list
+                # the column's sort key already holds its distinct values in
+                # sorted order, so only the values that are present in the
+                # rows being shown have to be picked out
+                codes, sorted_uniques = self._get_sort_key(col_name)
+                if df_for_unique is not self._unfiltered_df:
+                    codes = codes[self._get_view_positions()]
+                counts = np.bincount(codes + 1,
+                                     minlength=len(sorted_uniques) + 1)
+                # missing values come last in filter_values, but first
+                # in counts
+                value_positions = np.flatnonzero(np.roll(counts, -1))
+                self._sorted_column_cache[col_name] = \
+                    (cache_key, value_positions)
 
             if content['search_val'] is not None:
-                unique_list = [
-                    k for k in unique_list if
-                    content['search_val'].lower() in str(k).lower()
-                ]
+                search_index = self._get_search_index(col_name,
+                                                      filter_values)
+                value_positions = np.intersect1d(
+                    value_positions,
+                    search_index.search(content['search_val']),
+                    assume_unique=True
+                )
 
             # if the filter that we're opening is already active (as indicated
             # by the presence of a 'selected' attribute on the column's
             # filter_info attribute), show the selected rows at the top and
             # specify that they should be checked
+            selected_length = 0
+            filter_table = filter_values.take(value_positions)
+            table_positions = value_positions
             if 'filter_info' in col_info and \
                'selected' in col_info['filter_info']:
                 col_filter_info = col_info['filter_info']
                 col_filter_table = self._filter_tables[col_name]
-
-                def get_value_from_filter_table(k):
-                    return col_filter_table[k]
                 selected_indices = col_filter_info['selected'] or []
                 if selected_indices == 'all':
-                    excluded_indices = col_filter_info['excluded'] or []
-                    excluded_values = list(map(get_value_from_filter_table,
-                                               excluded_indices))
-                    non_excluded_count = 0
-                    for i in range(len(unique_list), 0, -1):
-                        unique_val = unique_list[i-1]
-                        if unique_val not in excluded_values:
-                            non_excluded_count += 1
-                            excluded_values.insert(0, unique_val)
-                    col_info['values'] = excluded_values
-                    col_info['selected_length'] = non_excluded_count
-                elif len(selected_indices) == 0:
-                    col_info['selected_length'] = 0
-                    col_info['values'] = unique_list
-                else:
-                    selected_vals = list(map(get_value_from_filter_table,
-                                             selected_indices))
-                    col_info['selected_length'] = len(selected_vals)
-
-                    in_selected = set(selected_vals)
-                    in_unique = set(unique_list)
-
-                    in_unique_but_not_selected = list(in_unique - in_selected)
-                    in_unique_but_not_selected.sort()
-                    selected_vals.extend(in_unique_but_not_selected)
-
-                    col_info['values'] = selected_vals
-            else:
-                col_info['selected_length'] = 0
-                col_info['values'] = unique_list
-
-            length = len(col_info['values'])
-
-            self._filter_tables[col_name] = list(col_info['values'])
+                    excluded_values = col_filter_table.take(
+                        np.asarray(col_filter_info['excluded'] or [],
+                                   dtype=np.int64)
+                    )
+                    excluded_positions = self._get_filter_value_positions(
+                        filter_values, excluded_values
+                    )
+                    is_excluded = np.isin(value_positions, excluded_positions)
+                    selected_length = len(value_positions) - \
+                        np.count_nonzero(is_excluded)
+                    table_positions = np.concatenate([
+                        value_positions[~is_excluded], excluded_positions
+                    ])
+                    filter_table = np.concatenate([
+                        filter_values.take(value_positions[~is_excluded]),
+                        excluded_values
+                    ])
+                elif len(selected_indices) > 0:
+                    selected_values = col_filter_table.take(
+                        np.asarray(selected_indices, dtype=np.int64)
+                    )
+                    selected_positions = self._get_filter_value_positions(
+                        filter_values, selected_values
+                    )
+                    is_selected = np.isin(value_positions, selected_positions)
+                    selected_length = len(selected_values)
+                    table_positions = np.concatenate([
+                        selected_positions, value_positions[~is_selected]
+                    ])
+                    filter_table = np.concatenate([
+                        selected_values,
+                        filter_values.take(value_positions[~is_selected])
+                    ])
+
+            # the table is kept as an array, and only the values that are
+            # sent to the browser are converted to python objects
+            self._filter_tables[col_name] = filter_table
+            self._filter_table_positions[col_name] = table_positions
+            col_info['selected_length'] = int(selected_length)
+            length = len(filter_table)
 
             if col_info['type'] == 'any':
+                col_info['values'] = filter_table.tolist()
                 col_info['value_range'] = (0, length)
             else:
-                max_items = PAGE_SIZE * 2
-                range_max = length
-                if length > max_items:
-                    col_info['values'] = col_info['values'][:max_items]
-                    range_max = max_items
+                range_max = min(length, PAGE_SIZE * 2)
+                col_info['values'] = list(
+                    map(stringify, filter_table[:range_max])
+                )
                 col_info['value_range'] = (0, range_max)
+            col_info['value_counts'] = self._get_filter_table_counts(
+                col_name, *col_info['value_range']
+            )
 
             col_info['viewport_range'] = col_info['value_range']
             col_info['length'] = length
+            col_info['index_memory'] = self._get_value_index_memory(col_name)
 
             self._columns[col_name] = col_info
 
@@ -1335,48 +2533,344 @@ class QgridWidget(widgets.DOMWidget):
         else:
             df[col_name] = col_series
 
-    def _append_condition_for_column(self, col_name, filter_info, conditions):
+    def _get_filter_key(self, col_name, filter_info):
+        # text filters refer to values by their position in the column's
+        # filter table, which changes whenever the dropdown is reopened, so
+        # the values themselves are used to identify those filters
+        if filter_info['type'] != 'text':
+            return filter_info
+        if col_name not in self._filter_tables:
+            return None
+        col_filter_table = self._filter_tables[col_name]
+        selected_indices = filter_info['selected']
+        excluded_indices = filter_info['excluded']
+
+        if selected_indices == "all":
+            if excluded_indices is not None and len(excluded_indices) > 0:
+                return ('excluded',
+                        col_filter_table.take(excluded_indices).tolist())
+        elif selected_indices is not None and len(selected_indices) > 0:
+            return ('selected',
+                    col_filter_table.take(selected_indices).tolist())
+        return None
+
+    def _get_filter_mask(self, col_name, filter_info):
+        """
+        Get a boolean mask over the rows of ``_unfiltered_df`` for the given
+        column filter, or None if the filter doesn't exclude any rows. Masks
+        are cached per column, so changing one column's filter only requires
+        that column's mask to be recomputed.
+        """
+        filter_key = self._get_filter_key(col_name, filter_info)
+        cached = self._filter_masks.get(col_name)
+        if cached is not None and cached[0] == filter_key:
+            return cached[1]
+
         col_series = self._get_col_series_from_df(col_name,
                                                   self._unfiltered_df)
+        conditions = []
         if filter_info['type'] == 'slider':
-            if filter_info['min'] is not None:
-                conditions.append(col_series >= filter_info['min'])
-            if filter_info['max'] is not None:
-                conditions.append(col_series <= filter_info['max'])
+            if filter_info['min'] is not None or \
+                    filter_info['max'] is not None:
+                conditions.append(self._get_range_mask(
+                    col_name, filter_info['min'], filter_info['max']
+                ))
         elif filter_info['type'] == 'date':
-            if filter_info['min'] is not None:
-                conditions.append(
-                    col_series >= pd.to_datetime(filter_info['min'], unit='ms')
-                )
-            if filter_info['max'] is not None:
-                conditions.append(
-                    col_series <= pd.to_datetime(filter_info['max'], unit='ms')
-                )
+            if filter_info['min'] is not None or \
+                    filter_info['max'] is not None:
+                def to_datetime64(ms):
+                    if ms is None:
+                        return None
+                    return pd.to_datetime(ms, unit='ms').to_datetime64()
+                conditions.append(self._get_range_mask(
+                    col_name,
+                    to_datetime64(filter_info['min']),
+                    to_datetime64(filter_info['max'])
+                ))
         elif filter_info['type'] == 'boolean':
             if filter_info['selected'] is not None:
                 conditions.append(
                     col_series == filter_info['selected']
                 )
-        elif filter_info['type'] == 'text':
-            if col_name not in self._filter_tables:
-                return
-            col_filter_table = self._filter_tables[col_name]
-            selected_indices = filter_info['selected']
-            excluded_indices = filter_info['excluded']
-
-            def get_value_from_filter_table(i):
-                return col_filter_table[i]
-            if selected_indices == "all":
-                if excluded_indices is not None and len(excluded_indices) > 0:
-                    excluded_values = list(
-                        map(get_value_from_filter_table, excluded_indices)
-                    )
-                    conditions.append(~col_series.isin(excluded_values))
-            elif selected_indices is not None and len(selected_indices) > 0:
-                selected_values = list(
-                    map(get_value_from_filter_table, selected_indices)
+        elif filter_info['type'] == 'text' and filter_key is not None:
+            mode, values = filter_key
+            conditions.append(
+                self._get_value_index_mask(col_name, values,
+                                           exclude=(mode == 'excluded'))
+            )
+
+        mask = None
+        for c in conditions:
+            if mask is None:
+                mask = np.array(c, dtype=bool)
+            else:
+                np.logical_and(mask, c, out=mask)
+
+        self._filter_masks[col_name] = (filter_key, mask)
+        return mask
+
+    def _get_range_index(self, col_name):
+        """
+        Get the sorted index for a numeric or date column, which is a tuple
+        of ``(order, sorted_values)`` where ``order`` holds the positions in
+        ``_unfiltered_df`` of the rows with non-missing values, in ascending
+        order of their values, and ``sorted_values`` holds those values.
+        """
+        if col_name in self._range_index_cache:
+            return self._range_index_cache[col_name]
+
+        col_series = self._get_col_series_from_df(col_name,
+                                                  self._unfiltered_df)
+        values = np.asarray(col_series.values)
+        order = np.flatnonzero(pd.notnull(values))
+        order = order[np.argsort(values[order], kind='mergesort')].astype(
+            np.int32 if len(values) < 2 ** 31 else np.int64
+        )
+
+        range_index = (order, values[order])
+        self._range_index_cache[col_name] = range_index
+        return range_index
+
+    def _get_range_summary(self, col_name, df):
+        """
+        Get the minimum and maximum of a numeric or date column's values in
+        ``df`` (which is either ``_df`` or ``_unfiltered_df``), along with a
+        histogram of the values, as a list of ``HISTOGRAM_BINS`` counts over
+        equal-width bins that span the range between them.  Summaries are
+        cached until the column's data or the filtered rows change.
+        """
+        use_view = df is not self._unfiltered_df and \
+            len(df) < len(self._unfiltered_df)
+        summary_key = self._view_generation if use_view else None
+        cached = self._range_summary_cache.get(col_name)
+        if cached is not None and cached[0] == summary_key:
+            return cached[1]
+
+        order, sorted_values = self._get_range_index(col_name)
+        if use_view:
+            # the column's sorted index is narrowed down to the rows in the
+            # view in a single pass, which leaves them in sorted order
+            in_view = np.zeros(len(self._unfiltered_df), dtype=bool)
+            in_view[self._get_view_positions()] = True
+            sorted_values = sorted_values[in_view[order]]
+
+        if len(sorted_values) == 0:
+            summary = (None, None, [])
+        else:
+            if sorted_values.dtype.kind == 'M':
+                numeric_values = sorted_values.view(np.int64)
+            else:
+                numeric_values = sorted_values
+            edges = np.linspace(numeric_values[0], numeric_values[-1],
+                                HISTOGRAM_BINS + 1)
+            # the last bin includes the maximum value
+            bin_starts = np.searchsorted(numeric_values, edges[1:-1])
+            histogram = np.diff(np.concatenate(
+                [[0], bin_starts, [len(numeric_values)]]
+            ))
+            summary = (
+                self._to_python_value(col_name, sorted_values[0]),
+                self._to_python_value(col_name, sorted_values[-1]),
+                histogram.tolist()
+            )
+
+        self._range_summary_cache[col_name] = (summary_key, summary)
+        return summary
+
+    def _to_python_value(self, col_name, value):
+        # convert a value from a column's sorted index into a python value
+        # which can be serialized and compared with the column's values
+        if isinstance(value, np.datetime64):
+            col_series = self._get_col_series_from_df(col_name,
+                                                      self._unfiltered_df)
+            tz = getattr(col_series.dtype, 'tz', None)
+            value = pd.Timestamp(value)
+            if tz is not None:
+                value = value.tz_localize('UTC').tz_convert(tz)
+            return value
+        return value.item() if isinstance(value, np.generic) else value
+
+    def _get_range_mask(self, col_name, min_value, max_value):
+        # the rows between min_value and max_value (inclusive) are found with
+        # two binary searches of the column's sorted values
+        order, sorted_values = self._get_range_index(col_name)
+        start = 0
+        end = len(sorted_values)
+        if min_value is not None:
+            start = np.searchsorted(sorted_values, min_value, side='left')
+        if max_value is not None:
+            end = np.searchsorted(sorted_values, max_value, side='right')
+
+        mask = np.zeros(len(self._unfiltered_df), dtype=bool)
+        mask[order[start:end]] = True
+        return mask
+
+    def _get_filter_values(self, col_name, col_series):
+        """
+        Get all of the values that can be shown in the text filter dropdown
+        for a column, in the order they're shown in.  For categorical
+        columns these are the categories, and for other columns they're
+        the sorted distinct values followed by a missing value.
+        """
+        if col_name in self._filter_values_cache:
+            return self._filter_values_cache[col_name]
+
+        if hasattr(col_series, 'cat'):
+            filter_values = np.asarray(col_series.cat.categories,
+                                       dtype=object)
+        else:
+            codes, sorted_uniques = self._get_sort_key(col_name)
+            filter_values = np.append(np.asarray(sorted_uniques,
+                                                 dtype=object),
+                                      np.nan)
+        self._filter_values_cache[col_name] = filter_values
+        return filter_values
+
+    def _get_view_filters_key(self, col_name):
+        # identifies the filters that determine which values of a column
+        # are in the filtered rows, which are the filters on the other
+        # columns and the filter expression
+        filters_key = []
+        for key, col_info in self._columns.items():
+            if key != col_name and 'filter_info' in col_info:
+                filters_key.append(
+                    (key, self._get_filter_key(key, col_info['filter_info']))
                 )
-                conditions.append(col_series.isin(selected_values))
+        if self._filter_expression is not None:
+            filters_key.append(self._filter_expression.expression)
+        return filters_key
+
+    @staticmethod
+    def _get_filter_value_positions(filter_values, values):
+        # the positions of the given values in a column's filter values, or
+        # -1 for values that aren't among them
+        return pd.Index(filter_values).get_indexer(values)
+
+    def _get_value_counts(self, col_name):
+        """
+        Get the number of rows that contain each of the values in a column's
+        filter dropdown, counting only the rows that pass the filters on the
+        other columns.  The counts are cached until the filter on one of the
+        other columns changes, or the data changes.
+        """
+        other_masks = []
+        counts_key = []
+        for key, col_info in self._columns.items():
+            if key == col_name or 'filter_info' not in col_info:
+                continue
+            mask = self._get_filter_mask(key, col_info['filter_info'])
+            if mask is not None:
+                other_masks.append(mask)
+                counts_key.append((key, self._filter_masks[key][0]))
+        filter_expression = self._filter_expression
+        if filter_expression is not None and \
+                col_name not in filter_expression.columns:
+            other_masks.append(self._get_filter_expression_mask())
+            counts_key.append(filter_expression.expression)
+
+        cached = self._value_counts_cache.get(col_name)
+        if cached is not None and cached[0] == counts_key:
+            return cached[1]
+
+        col_series = pd.Series(
+            self._get_col_series_from_df(col_name, self._unfiltered_df)
+        )
+        if hasattr(col_series, 'cat'):
+            codes = np.asarray(col_series.cat.codes)
+            n_values = len(col_series.cat.categories)
+        else:
+            codes, sorted_uniques = self._get_sort_key(col_name)
+            n_values = len(sorted_uniques)
+
+        if other_masks:
+            mask = other_masks[0].copy()
+            for other_mask in other_masks[1:]:
+                np.logical_and(mask, other_mask, out=mask)
+            codes = codes[mask]
+        counts = np.bincount(codes + 1, minlength=n_values + 1)
+
+        # align the counts with the column's filter values, in which missing
+        # values come last (or are left out, for categorical columns)
+        if hasattr(col_series, 'cat'):
+            counts = counts[1:]
+        else:
+            counts = np.roll(counts, -1)
+        self._value_counts_cache[col_name] = (counts_key, counts)
+        return counts
+
+    def _get_filter_table_counts(self, col_name, from_index, to_index):
+        # the counts for a page of the values in a column's filter table
+        positions = self._filter_table_positions.get(col_name)
+        if positions is None:
+            return None
+        counts = self._get_value_counts(col_name)
+        positions = positions[from_index:to_index]
+        page_counts = counts.take(np.maximum(positions, 0))
+        page_counts[positions < 0] = 0
+        return page_counts.tolist()
+
+    def _get_search_index(self, col_name, filter_values):
+        # built the first time the dropdown for the column is searched
+        if col_name not in self._search_index_cache:
+            self._search_index_cache[col_name] = \
+                _SubstringIndex(filter_values)
+        return self._search_index_cache[col_name]
+
+    def _get_value_index(self, col_name):
+        """
+        Get the inverted index for a column, which maps each of the column's
+        distinct values to the positions of the rows in ``_unfiltered_df``
+        that contain it. The index is a tuple of ``(offsets, positions)``,
+        where the rows containing the value with sort key code ``i`` are
+        ``positions[offsets[i + 1]:offsets[i + 2]]``, and the rows with
+        missing values are ``positions[offsets[0]:offsets[1]]``.
+        """
+        if col_name in self._value_index_cache:
+            return self._value_index_cache[col_name]
+
+        codes, sorted_uniques = self._get_sort_key(col_name)
+        counts = np.bincount(codes + 1, minlength=len(sorted_uniques) + 1)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        positions = np.argsort(codes, kind='mergesort').astype(
+            np.int32 if len(codes) < 2 ** 31 else np.int64
+        )
+
+        value_index = (offsets, positions)
+        self._value_index_cache[col_name] = value_index
+        return value_index
+
+    def _get_value_index_memory(self, col_name):
+        if col_name not in self._value_index_cache:
+            return 0
+        offsets, positions = self._value_index_cache[col_name]
+        return int(offsets.nbytes + positions.nbytes)
+
+    def _get_value_index_mask(self, col_name, values, exclude=False):
+        """
+        Get a boolean mask over the rows of ``_unfiltered_df`` which is True
+        for the rows that contain one of ``values`` (or that don't contain
+        any of them, if ``exclude`` is True). Only the index entries for
+        ``values`` are visited, rather than every row of the column.
+        """
+        offsets, positions = self._get_value_index(col_name)
+        codes, sorted_uniques = self._get_sort_key(col_name)
+
+        slots = pd.Index(sorted_uniques).get_indexer(values) + 1
+        # missing values aren't in sorted_uniques, and use the first slot
+        slots[pd.isnull(values)] = 0
+        slots = slots[(slots > 0) | pd.isnull(values)]
+
+        # gather the rows of all of the selected index entries at once
+        starts = offsets[slots]
+        lengths = offsets[slots + 1] - starts
+        run_starts = np.repeat(starts - (np.cumsum(lengths) - lengths),
+                               lengths)
+        rows = positions[run_starts + np.arange(lengths.sum())]
+
+        mask = np.full(len(codes), exclude, dtype=bool)
+        mask[rows] = not exclude
+        return mask
 
     def _handle_change_filter(self, content):
         col_name = content['field']
@@ -1384,36 +2878,208 @@ class QgridWidget(widgets.DOMWidget):
         col_info = columns[col_name]
         col_info['filter_info'] = content['filter_info']
         columns[col_name] = col_info
+        self._columns = columns
+        self._filters_changed = True
 
-        conditions = []
-        for key, value in columns.items():
-            if 'filter_info' in value:
-                self._append_condition_for_column(
-                    key, value['filter_info'], conditions
-                )
+    def _set_filter_expression(self, expression):
+        if not expression or not expression.strip():
+            self._filter_expression = None
+            self._filter_expression_text = ''
+        else:
+            column_types = dict(
+                (col_name, col_info['type'])
+                for col_name, col_info in self._columns.items()
+                if col_name != self._index_col_name
+            )
+            filter_expression = _FilterExpression(expression, column_types)
+            # evaluate the expression right away so that any errors are
+            # reported to the caller, rather than from _update_filters
+            filter_expression.mask = filter_expression.evaluate(
+                self._get_filter_expression_column
+            )
+            self._filter_expression = filter_expression
+            self._filter_expression_text = expression
+        self._filters_changed = True
+
+    def _get_filter_expression_column(self, col_name):
+        return self._get_col_series_from_df(col_name, self._unfiltered_df)
+
+    def _get_filter_expression_mask(self):
+        filter_expression = self._filter_expression
+        if filter_expression.mask is None:
+            filter_expression.mask = filter_expression.evaluate(
+                self._get_filter_expression_column
+            )
+        return filter_expression.mask
 
-        self._columns = columns
+    def _update_filters(self, token):
+        self._set_filtered_view(self._filter_view(token))
 
-        self._ignore_df_changed = True
-        if len(conditions) == 0:
-            self._df = self._unfiltered_df.copy()
+    def _filter_view(self, token):
+        """
+        Apply the current filters to ``_unfiltered_df`` without changing
+        the current view, so that it can be done on a worker thread.
+        Returns the filtered rows, to pass to ``_set_filtered_view``.
+        """
+        columns = dict(self._columns)
+        combined_mask = None
+        for i, (key, value) in enumerate(columns.items()):
+            token.check(progress=0.5 * i / len(columns))
+            if 'filter_info' not in value:
+                continue
+            mask = self._get_filter_mask(key, value['filter_info'])
+            if mask is None:
+                continue
+            if combined_mask is None:
+                combined_mask = mask.copy()
+            else:
+                np.logical_and(combined_mask, mask, out=combined_mask)
+
+        if self._filter_expression is not None:
+            mask = self._get_filter_expression_mask()
+            if combined_mask is None:
+                combined_mask = mask.copy()
+            else:
+                np.logical_and(combined_mask, mask, out=combined_mask)
+
+        if combined_mask is None:
+            df = self._unfiltered_df.copy()
         else:
-            combined_condition = conditions[0]
-            for c in conditions[1:]:
-                combined_condition = combined_condition & c
+            df = self._unfiltered_df.take(np.flatnonzero(combined_mask))
+        token.check(progress=0.5)
+        return df
 
-            self._df = self._unfiltered_df[combined_condition].copy()
+    def _set_filtered_view(self, df):
+        # make the result of _filter_view the current view
+        self._cancel_pending_sort()
+        self._ignore_df_changed = True
+        self._df = df
+        self._view_generation += 1
+        self._filters_changed = False
 
         if len(self._df) < self._viewport_range[0]:
             viewport_size = self._viewport_range[1] - self._viewport_range[0]
             range_top = max(0, len(self._df) - viewport_size)
             self._viewport_range = (range_top, range_top + viewport_size)
-
-        self._sorted_column_cache = {}
-        self._update_sort()
-        self._update_table(triggered_by='change_filter')
         self._ignore_df_changed = False
 
+    def _schedule_view_update(self, triggered_by, events):
+        """
+        Recompute the view after the filters or the sort changed, and then
+        fire the given events. Views of large frames are recomputed on a
+        worker thread, and any update that's still running is cancelled
+        since the new one will reflect its changes as well.  The worker
+        thread only computes the new view; it's swapped in, sent to the
+        browser and followed by the events on the kernel's thread, by
+        ``_flush_view_update``.
+        """
+        with self._view_state_lock:
+            if self._view_token is not None:
+                self._view_token.cancel()
+            self._view_events = self._view_events + events
+
+            if len(self._unfiltered_df) < BACKGROUND_MIN_ROWS:
+                token = self._view_token = _CancellationToken()
+            else:
+                loop = _get_running_loop()
+
+                def send_progress(progress):
+                    if loop is not None:
+                        loop.call_soon_threadsafe(
+                            self._send_view_progress, token, triggered_by,
+                            progress
+                        )
+                token = self._view_token = _CancellationToken(send_progress)
+
+        if token.on_progress is None:
+            self._run_view_update(token, triggered_by)
+            self._flush_view_update()
+            return
+
+        def run_view_update():
+            self._run_view_update(token, triggered_by)
+            # without an event loop to hand the view to, it's swapped in
+            # by _wait_for_view or when the next message arrives instead
+            if loop is not None:
+                loop.call_soon_threadsafe(self._flush_view_update)
+
+        self._send_operation_progress(triggered_by, 'started', 0)
+        self._view_thread = threading.Thread(target=run_view_update)
+        self._view_thread.daemon = True
+        self._view_thread.start()
+
+    def _run_view_update(self, token, triggered_by):
+        # compute the new view, and leave it for _flush_view_update to swap
+        # in if no newer update has been scheduled in the meantime
+        with self._view_lock:
+            try:
+                token.check()
+                filters_changed = self._filters_changed
+                df = self._df
+                if filters_changed:
+                    df = self._filter_view(token)
+                sorted_view = self._sort_view(df, token)
+            except _OperationCancelled:
+                return
+            with self._view_state_lock:
+                if self._view_token is token:
+                    self._view_result = (token, triggered_by,
+                                         filters_changed, df, sorted_view)
+
+    def _flush_view_update(self):
+        """
+        Swap in the view computed by the latest view update, if it has
+        finished, and then send it to the browser and fire the events that
+        were waiting for it.  Must be called on the kernel's thread.
+        """
+        with self._view_state_lock:
+            result = self._view_result
+            self._view_result = None
+            if result is None or result[0] is not self._view_token or \
+                    result[0].cancelled:
+                return
+            self._view_token = None
+            events = self._view_events
+            self._view_events = []
+
+        token, triggered_by, filters_changed, df, sorted_view = result
+        if filters_changed:
+            self._set_filtered_view(df)
+        self._set_sorted_view(*sorted_view)
+        self._update_table(triggered_by=triggered_by)
+        if token.on_progress is not None:
+            self._send_operation_progress(triggered_by, 'finished', 1)
+        for event in events:
+            self._notify_listeners(event)
+
+    def _send_view_progress(self, token, triggered_by, progress):
+        # progress of an update that has since finished or been cancelled
+        # isn't sent, since it would show the progress indicator again
+        if token is self._view_token and not token.cancelled:
+            self._send_operation_progress(triggered_by, 'progress', progress)
+
+    def _send_operation_progress(self, triggered_by, state, progress):
+        self.send({
+            'type': 'operation_progress',
+            'triggered_by': triggered_by,
+            'state': state,
+            'progress': progress
+        })
+
+    def _wait_for_view(self):
+        """
+        Wait for any view update or lazy sort that's running in the
+        background. Must be called before anything that relies on the rows
+        in ``_df`` or their order.
+        """
+        # only the latest update matters, since any earlier ones have been
+        # cancelled
+        thread = self._view_thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._flush_view_update()
+        self._finish_pending_sort()
+
     def _handle_qgrid_msg(self, widget, content, buffers=None):
         try:
             self._handle_qgrid_msg_helper(content)
@@ -1426,6 +3092,19 @@ class QgridWidget(widgets.DOMWidget):
         if 'type' not in content:
             return
 
+        # a view update or lazy sort that finished on a worker thread is
+        # swapped in before the message is handled, in case it couldn't be
+        # handed back to the kernel's thread
+        self._flush_view_update()
+        self._swap_pending_sort()
+
+        # the filter dropdown lists the values in the rows being shown, so
+        # it needs the view that reflects the current filters as well
+        if content['type'] in ['edit_cell', 'change_selection', 'add_row',
+                               'remove_row', 'paste_cells', 'fill_down',
+                               'show_filter_dropdown']:
+            self._wait_for_view()
+
         if content['type'] == 'edit_cell':
             col_info = self._columns[content['column']]
             try:
@@ -1442,9 +3121,18 @@ class QgridWidget(widgets.DOMWidget):
 
                 self._df.loc[location] = val_to_set
 
-                query = self._unfiltered_df[self._index_col_name] == \
+                ids = np.array([content['unfiltered_index']], dtype=np.int64)
+                columns = np.array([content['column']], dtype=object)
+                old_values = self._get_cell_values(ids, columns)
+                position = self._unfiltered_positions[
                     content['unfiltered_index']
-                self._unfiltered_df.loc[query, content['column']] = val_to_set
+                ]
+                self._unfiltered_df.iat[
+                    position,
+                    self._unfiltered_df.columns.get_loc(content['column'])
+                ] = val_to_set
+                self._clear_column_caches([content['column']])
+                self._record_edit(ids, columns, old_values)
                 self._notify_listeners({
                     'name': 'cell_edited',
                     'index': location[0],
@@ -1466,7 +3154,14 @@ class QgridWidget(widgets.DOMWidget):
                 })
                 return
         elif content['type'] == 'change_selection':
-            self._change_selection(content['rows'], 'gui')
+            # the grid sends ranges of rows, so that selecting a large block
+            # of rows (or all of them) doesn't need a message per row
+            if 'ranges' in content:
+                ranges = content['ranges']
+            else:
+                ranges = _rows_to_ranges(content['rows'])
+            self._change_selection(_normalize_ranges(ranges, len(self._df)),
+                                   'gui')
         elif content['type'] == 'change_viewport':
             old_viewport_range = self._viewport_range
             self._viewport_range = (content['top'], content['bottom'])
@@ -1496,6 +3191,35 @@ class QgridWidget(widgets.DOMWidget):
                 'indices': removed_indices,
                 'source': 'gui'
             })
+        elif content['type'] in ['undo', 'redo']:
+            self._apply_journal_entry(content['type'])
+        elif content['type'] in ['paste_cells', 'fill_down']:
+            row_start = content['row_start']
+            values = content.get('values')
+            if content['type'] == 'fill_down':
+                # the first row's values are copied to the rest of the range
+                values = [[self._df[col_name].iloc[row_start]
+                           for col_name in content['columns']]]
+                row_start += 1
+            try:
+                indices, columns, old_values, new_values = \
+                    self._edit_range(row_start, content['row_end'],
+                                     content['columns'], values)
+            except (ValueError, TypeError) as e:
+                self.send({
+                    'type': 'show_error',
+                    'error_msg': "Couldn't edit the cells: %s" % e,
+                    'triggered_by': content['type']
+                })
+                return
+            self._notify_listeners({
+                'name': 'cells_edited',
+                'index': indices,
+                'column': columns,
+                'old': old_values,
+                'new': new_values,
+                'source': 'gui'
+            })
         elif content['type'] == 'change_filter_viewport':
             col_name = content['field']
             col_info = self._columns[col_name]
@@ -1505,8 +3229,13 @@ class QgridWidget(widgets.DOMWidget):
             to_index = max(content['top'] + PAGE_SIZE, 0)
 
             old_viewport_range = col_info['viewport_range']
-            col_info['values'] = col_filter_table[from_index:to_index]
+            col_info['values'] = list(
+                map(stringify, col_filter_table[from_index:to_index])
+            )
             col_info['value_range'] = (from_index, to_index)
+            col_info['value_counts'] = self._get_filter_table_counts(
+                col_name, from_index, to_index
+            )
             col_info['viewport_range'] = (content['top'], content['bottom'])
 
             self._columns[col_name] = col_info
@@ -1526,10 +3255,26 @@ class QgridWidget(widgets.DOMWidget):
             old_ascending = self._sort_ascending
             self._sort_field = content['sort_field']
             self._sort_ascending = content['sort_ascending']
-            self._sorted_column_cache = {}
-            self._update_sort()
-            self._update_table(triggered_by='change_sort')
-            self._notify_listeners({
+
+            # a shift-click adds the column as an additional sort key (or
+            # changes its direction if it's already one of the sort keys)
+            new_sort = [self._sort_field, self._sort_ascending]
+            if content.get('multi'):
+                sort_columns = [
+                    sort for sort in self._sort_columns
+                    if sort[0] != self._sort_field
+                ]
+                if len(sort_columns) < len(self._sort_columns):
+                    sort_columns = [
+                        new_sort if sort[0] == self._sort_field else sort
+                        for sort in self._sort_columns
+                    ]
+                else:
+                    sort_columns.append(new_sort)
+                self._sort_columns = sort_columns
+            else:
+                self._sort_columns = [new_sort]
+            self._schedule_view_update('change_sort', [{
                 'name': 'sort_changed',
                 'old': {
                     'column': old_column,
@@ -1539,7 +3284,7 @@ class QgridWidget(widgets.DOMWidget):
                     'column': self._sort_field,
                     'ascending': self._sort_ascending
                 }
-            })
+            }])
         elif content['type'] == 'show_filter_dropdown':
             self._handle_show_filter_dropdown(content)
             self._notify_listeners({
@@ -1548,10 +3293,25 @@ class QgridWidget(widgets.DOMWidget):
             })
         elif content['type'] == 'change_filter':
             self._handle_change_filter(content)
-            self._notify_listeners({
+            self._schedule_view_update('change_filter', [{
                 'name': 'filter_changed',
                 'column': content['field']
-            })
+            }])
+        elif content['type'] == 'change_filter_expression':
+            try:
+                self._set_filter_expression(content['expression'])
+            except ValueError as e:
+                self.send({
+                    'type': 'show_error',
+                    'error_msg': str(e),
+                    'triggered_by': 'change_filter_expression'
+                })
+                return
+            self._schedule_view_update('change_filter', [{
+                'name': 'filter_changed',
+                'column': None,
+                'expression': content['expression']
+            }])
 
     def _notify_listeners(self, event):
         # notify listeners at the module level
@@ -1569,21 +3329,137 @@ class QgridWidget(widgets.DOMWidget):
 
         :rtype: DataFrame
         """
+        self._wait_for_view()
         col_names_to_drop = list(self._sort_helper_columns.values())
         col_names_to_drop.append(self._index_col_name)
         return self._df.drop(col_names_to_drop, axis=1)
 
+    def get_edits(self):
+        """
+        Get the edits that have been made to the DataFrame since the last
+        call to ``checkpoint`` (or since the grid was created), which
+        include edits made in the grid interface and with api methods such
+        as ``edit_cells``, ``add_rows`` and ``remove_rows``.  Only the
+        changes themselves are returned, so this is much cheaper than
+        comparing ``get_changed_df()`` with the original DataFrame.  Cells
+        that were edited and then changed back (e.g. by ``undo``) aren't
+        included.
+
+        Returns
+        -------
+        dict
+            A dict with the following keys:
+
+            * **edited_cells** A DataFrame with one row per edited cell,
+              indexed by the index of the cell's row, with ``column``,
+              ``old`` and ``new`` columns holding the name of the cell's
+              column, its value at the checkpoint and its current value.
+              Cells of rows that have been added or removed since the
+              checkpoint aren't included.
+            * **added_rows** A DataFrame of the rows that have been added
+              since the checkpoint (including removed rows that were put
+              back by ``undo``), with their current values.
+            * **removed_indices** A list of the indices of the rows that
+              existed at the checkpoint and have since been removed.
+
+        See Also
+        --------
+        QgridWidget.checkpoint:
+            The method for starting to track edits afresh.
+        """
+        self._wait_for_view()
+        tracker = self._edit_tracker
+        positions = self._unfiltered_positions
+        # rows that are in the grid now but weren't at the checkpoint have
+        # been added since (or put back by undo)
+        was_present = np.zeros(len(positions), dtype=bool)
+        was_present[:tracker.next_id] = tracker.present
+        is_added = (positions >= 0) & ~was_present
+
+        edited_indices = []
+        edited_columns = []
+        old_values = []
+        new_values = []
+        for col_name, chunks in tracker.edited.items():
+            ids = np.concatenate([chunk[0] for chunk in chunks])
+            old = np.concatenate([chunk[1] for chunk in chunks])
+            # the value a cell had at the checkpoint is the old value from
+            # its first edit since then
+            ids, first = np.unique(ids, return_index=True)
+            old = old[first]
+            exists = (positions[ids] >= 0) & was_present[ids]
+            ids, old = ids[exists], old[exists]
+            columns = np.repeat(np.array([col_name], dtype=object), len(ids))
+            new = self._get_cell_values(ids, columns)
+            changed = pd.isnull(old) != pd.isnull(new)
+            both_set = ~(pd.isnull(old) | pd.isnull(new))
+            changed[both_set] = old[both_set] != new[both_set]
+            edited_indices.append(
+                self._unfiltered_df.index.take(positions[ids[changed]])
+            )
+            edited_columns.append(columns[changed])
+            old_values.append(old[changed])
+            new_values.append(new[changed])
+
+        edited_index = self._unfiltered_df.index[:0]
+        if len(edited_indices) > 0:
+            edited_index = edited_index.append(edited_indices)
+        edited_cells = pd.DataFrame({
+            'column': np.concatenate(edited_columns + [np.empty(0, object)]),
+            'old': np.concatenate(old_values + [np.empty(0, object)]),
+            'new': np.concatenate(new_values + [np.empty(0, object)])
+        }, index=edited_index, columns=['column', 'old', 'new'])
+
+        added_rows = self._unfiltered_df.take(
+            np.sort(positions[is_added])
+        ).drop(self._get_internal_columns(), axis=1)
+
+        removed_indices = []
+        if len(tracker.removed) > 0:
+            ids = np.concatenate([chunk[0] for chunk in tracker.removed])
+            indices = np.concatenate([chunk[1] for chunk in tracker.removed])
+            # rows that have been put back by undo aren't removed any more
+            is_removed = (positions[ids] < 0) & tracker.present[ids]
+            ids, first = np.unique(ids[is_removed], return_index=True)
+            removed_indices = indices[is_removed][np.sort(first)].tolist()
+
+        return {
+            'edited_cells': edited_cells,
+            'added_rows': added_rows,
+            'removed_indices': removed_indices
+        }
+
+    def checkpoint(self):
+        """
+        Stop tracking the edits that have been made so far, so that
+        ``get_edits`` only returns the edits made after this call.  This is
+        typically called once the edits returned by ``get_edits`` have been
+        saved.  It doesn't affect the edits that can be undone.
+
+        See Also
+        --------
+        QgridWidget.get_edits:
+            The method for getting the edits made since a checkpoint.
+        """
+        self._wait_for_view()
+        self._edit_tracker = _EditTracker(self._unfiltered_positions)
+
     def get_selected_df(self):
         """
         Get a DataFrame which reflects the current state of the UI and only
-        includes the currently selected row(s). Internally it calls
-        ``get_changed_df()`` and then filters down to the selected rows
-        using ``iloc``.
+        includes the currently selected row(s), in the same form as
+        ``get_changed_df()``.  The selected rows are taken first, so only
+        they are copied when qgrid's internal columns are dropped.
 
         :rtype: DataFrame
         """
-        changed_df = self.get_changed_df()
-        return changed_df.iloc[self._selected_rows]
+        self._wait_for_view()
+        ranges = self._get_selection_ranges()
+        if len(ranges) == 1:
+            selected_df = self._df.iloc[ranges[0, 0]:ranges[0, 1]]
+        else:
+            selected_df = self._df.take(_ranges_to_rows(ranges))
+        return selected_df.drop(self._get_internal_columns(), axis=1)
 
     def get_selected_rows(self):
         """
@@ -1593,6 +3469,16 @@ class QgridWidget(widgets.DOMWidget):
         """
         return self._selected_rows
 
+    @property
+    def _selected_rows(self):
+        # the selection is stored as ranges of positions in the view, so
+        # selecting every row of a large view doesn't need a list of them
+        return _ranges_to_rows(self._get_selection_ranges()).tolist()
+
+    def _get_selection_ranges(self):
+        # the view may have been filtered down since the rows were selected
+        return _normalize_ranges(self._selection_ranges, len(self._df))
+
     def add_row(self, row=None):
         """
         Append a row at the end of the DataFrame.  Values for the new row
@@ -1613,6 +3499,7 @@ class QgridWidget(widgets.DOMWidget):
         QgridWidget.remove_rows:
             The method for removing a row (or rows).
         """
+        self._wait_for_view()
         if row is None:
             added_index = self._duplicate_last_row()
         else:
@@ -1624,6 +3511,40 @@ class QgridWidget(widgets.DOMWidget):
             'source': 'api'
         })
 
+    def add_rows(self, rows):
+        """
+        Append rows at the end of the DataFrame.  All of the rows are added
+        in a single step, which preserves the types of the DataFrame's
+        columns wherever the new values allow it.  Results in a single
+        ``rows_added`` event.
+
+        Parameters
+        ----------
+        rows : DataFrame
+            The rows to add, which must have the same columns as the
+            DataFrame (in any order), and the indices of the new rows as its
+            index.
+
+        Raises
+        ------
+        ValueError
+            If the columns of ``rows`` don't match the columns of the
+            DataFrame, or if any of the indices of ``rows`` are already in
+            the DataFrame or appear more than once in ``rows``.
+
+        See Also
+        --------
+        QgridWidget.add_row:
+            The method for adding a single row.
+        """
+        self._wait_for_view()
+        self._add_rows(rows)
+        self._notify_listeners({
+            'name': 'rows_added',
+            'indices': list(rows.index),
+            'source': 'api'
+        })
+
     def _duplicate_last_row(self):
         """
         Append a row at the end of the DataFrame by duplicating the
@@ -1632,7 +3553,7 @@ class QgridWidget(widgets.DOMWidget):
         """
         df = self._df
 
-        if not df.index.is_integer():
+        if not pd.api.types.is_integer_dtype(df.index):
             msg = "Cannot add a row to a table with a non-integer index"
             self.send({
                 'type': 'show_error',
@@ -1642,14 +3563,13 @@ class QgridWidget(widgets.DOMWidget):
             return
 
         last_index = max(df.index)
-        last = df.loc[last_index].copy()
-        last.name += 1
-        last[self._index_col_name] = last.name
-        df.loc[last.name] = last.values
-        self._unfiltered_df.loc[last.name] = last.values
-        self._update_table(triggered_by='add_row',
-                           scroll_to_row=df.index.get_loc(last.name))
-        return last.name
+        last = df.loc[[last_index]].iloc[-1:]
+        last = last.drop(self._get_internal_columns(), axis=1)
+        # rows that are filtered out of the view may have larger indices
+        new_index = max(self._unfiltered_df.index) + 1
+        last.index = pd.Index([new_index], name=df.index.name)
+        self._add_rows(last)
+        return new_index
 
     def _add_row(self, row):
         """
@@ -1660,14 +3580,12 @@ class QgridWidget(widgets.DOMWidget):
         df = self._df
 
         col_names, col_data = zip(*row)
-        col_names = list(col_names)
-        col_data = list(col_data)
         index_col_val = dict(row)[df.index.name]
 
         # check that the given column names match what
         # already exists in the dataframe
         required_cols = set(df.columns.values).union({df.index.name}) - \
-            {self._index_col_name}
+            set(self._get_internal_columns())
         if set(col_names) != required_cols:
             msg = "Cannot add row -- column names don't match in "\
                   "the existing dataframe"
@@ -1678,19 +3596,76 @@ class QgridWidget(widgets.DOMWidget):
             })
             return
 
-        for i, s in enumerate(col_data):
-            if col_names[i] == df.index.name:
-                continue
+        new_row = pd.DataFrame(
+            dict((name, [value]) for name, value in row
+                 if name != df.index.name),
+            index=pd.Index([index_col_val], name=df.index.name)
+        )
+        self._add_rows(new_row)
+        return index_col_val
 
-            df.loc[index_col_val, col_names[i]] = s
-            self._unfiltered_df.loc[index_col_val, col_names[i]] = s
+    def _get_internal_columns(self):
+        # the columns that qgrid adds to the DataFrame for its own use
+        return [self._index_col_name] + \
+            list(self._sort_helper_columns.values())
+
+    def _add_rows(self, rows):
+        internal_columns = self._get_internal_columns()
+        user_columns = [col_name for col_name in self._unfiltered_df.columns
+                        if col_name not in internal_columns]
+        if set(rows.columns) != set(user_columns):
+            raise ValueError("Cannot add rows -- column names don't match "
+                             "the existing dataframe")
+        # rows are found by their index when they're edited or removed, so
+        # the indices of the new rows have to be unique
+        is_duplicate = rows.index.duplicated() | \
+            rows.index.isin(self._unfiltered_df.index)
+        if is_duplicate.any():
+            raise ValueError(
+                "Cannot add rows -- indices already exist in the "
+                "dataframe: %s" % list(rows.index[is_duplicate])
+            )
 
+        # the new rows get the next unused qgrid_unfiltered_index values,
+        # and are added at the end of the unfiltered frame, so the existing
+        # entries of the position mapping stay valid
+        next_id = len(self._unfiltered_positions)
+        new_ids = np.arange(next_id, next_id + len(rows))
+        new_rows = rows.copy()
+        new_rows[self._index_col_name] = new_ids
+        for col_name, sort_column_name in self._sort_helper_columns.items():
+            if col_name in self._primary_key:
+                periods = new_rows.index.get_level_values(col_name)
+            else:
+                periods = new_rows[col_name]
+            new_rows[sort_column_name] = \
+                pd.PeriodIndex(periods).to_timestamp()
+        new_rows = new_rows[self._unfiltered_df.columns]
+
+        for col_name in self._unfiltered_df.columns:
+            dtype = self._unfiltered_df[col_name].dtype
+            if new_rows[col_name].dtype != dtype:
+                try:
+                    new_rows[col_name] = new_rows[col_name].astype(dtype)
+                except (ValueError, TypeError):
+                    pass
+
+        unfiltered_length = len(self._unfiltered_df)
+        view_length = len(self._df)
+        self._unfiltered_df = pd.concat([self._unfiltered_df, new_rows])
+        self._df = pd.concat([self._df, new_rows])
+        self._unfiltered_positions = np.concatenate([
+            self._unfiltered_positions,
+            np.arange(unfiltered_length, unfiltered_length + len(rows))
+        ])
+        self._journal.record({'kind': 'add', 'cells': len(rows),
+                              'ids': new_ids})
+
+        self._clear_column_caches()
         self._update_table(triggered_by='add_row',
-                           scroll_to_row=df.index.get_loc(index_col_val),
+                           scroll_to_row=view_length,
                            fire_data_change_event=True)
 
-        return index_col_val
-
     def edit_cell(self, index, column, value):
         """
         Edit a cell of the grid, given the index and column of the cell
@@ -1706,11 +3681,23 @@ class QgridWidget(widgets.DOMWidget):
         value : object
             The new value for the cell.
         """
+        self._wait_for_view()
         old_value = self._df.loc[index, column]
+        ids = np.atleast_1d(np.asarray(
+            self._df.loc[index, self._index_col_name], dtype=np.int64
+        ))
+        columns = np.repeat(np.array([column], dtype=object), len(ids))
+        old_values = self._get_cell_values(ids, columns)
         self._df.loc[index, column] = value
-        self._unfiltered_df.loc[index, column] = value
-        self._update_table(triggered_by='edit_cell',
-                           fire_data_change_event=True)
+        # the rows are written by their position in _unfiltered_df, as the
+        # gui's edits are, since its index may have duplicate labels
+        self._unfiltered_df.iloc[
+            self._unfiltered_positions[ids],
+            self._unfiltered_df.columns.get_loc(column)
+        ] = value
+        self._clear_column_caches([column])
+        self._record_edit(ids, columns, old_values)
+        self._patch_cells(self._df.index.get_indexer_for([index]), columns)
 
         self._notify_listeners({
             'name': 'cell_edited',
@@ -1721,6 +3708,381 @@ class QgridWidget(widgets.DOMWidget):
             'source': 'api'
         })
 
+    def edit_cells(self, updates):
+        """
+        Edit many cells of the grid at once.  The cells are written to the
+        DataFrame one column at a time, and the grid is refreshed once
+        afterwards.  Results in a single ``cells_edited`` event.
+
+        Parameters
+        ----------
+        updates : DataFrame or list
+            Either a DataFrame whose index holds the indices of the rows to
+            edit and whose columns are the columns to edit, in which case
+            every cell of the DataFrame is written to the grid, or a list of
+            3-tuples of (index, column name, new value).
+
+        Raises
+        ------
+        KeyError
+            If any of the rows or columns don't exist in the grid.
+        ValueError
+            If the DataFrame has a non-unique index, since rows can't be
+            identified by their index in that case.
+
+        See Also
+        --------
+        QgridWidget.edit_cell:
+            The method for editing a single cell.
+        """
+        self._wait_for_view()
+        if isinstance(updates, pd.DataFrame):
+            n_rows = len(updates)
+            indices = np.tile(np.asarray(updates.index, dtype=object),
+                              len(updates.columns))
+            columns = np.repeat(np.asarray(updates.columns, dtype=object),
+                                n_rows)
+            new_values = np.empty(len(indices), dtype=object)
+            for i in range(len(updates.columns)):
+                new_values[i * n_rows:(i + 1) * n_rows] = \
+                    updates.iloc[:, i].values
+        else:
+            indices = np.empty(len(updates), dtype=object)
+            columns = np.empty(len(updates), dtype=object)
+            new_values = np.empty(len(updates), dtype=object)
+            for i, (index, column, value) in enumerate(updates):
+                indices[i], columns[i], new_values[i] = index, column, value
+
+        if not self._df.index.is_unique:
+            raise ValueError("Can't edit cells of a DataFrame with a "
+                             "non-unique index")
+        positions = self._df.index.get_indexer(indices)
+        if (positions < 0).any():
+            raise KeyError(list(indices[positions < 0]))
+        unknown_columns = set(columns) - \
+            (set(self._df.columns) - set([self._index_col_name]))
+        if len(unknown_columns) > 0:
+            raise KeyError(list(unknown_columns))
+
+        ids = np.asarray(self._df[self._index_col_name].values,
+                         dtype=np.int64)[positions]
+        old_values = self._write_cells(ids, columns, new_values, positions)
+        self._record_edit(ids, columns, old_values)
+        self._patch_cells(positions, columns)
+
+        self._notify_listeners({
+            'name': 'cells_edited',
+            'index': indices,
+            'column': columns,
+            'old': old_values,
+            'new': new_values,
+            'source': 'api'
+        })
+
+    def _get_cell_values(self, ids, columns):
+        """
+        Get the values of the cells given by the ``qgrid_unfiltered_index``
+        of their rows and the names of their columns, as an object array.
+        """
+        positions = self._unfiltered_positions[ids]
+        values = np.empty(len(ids), dtype=object)
+        for col_name in pd.unique(columns):
+            is_col = np.flatnonzero(columns == col_name)
+            # the values are boxed before being copied to the object array,
+            # which would otherwise hold dates as integer nanoseconds
+            values[is_col] = self._unfiltered_df.iloc[
+                positions[is_col],
+                self._unfiltered_df.columns.get_loc(col_name)
+            ].astype(object).values
+        return values
+
+    def _get_view_positions_of(self, ids):
+        # the positions in _df of the rows with the given ids, or -1 for
+        # rows that aren't in the view
+        view_ids = np.asarray(self._df[self._index_col_name].values,
+                              dtype=np.int64)
+        view_positions = np.full(len(self._unfiltered_positions), -1,
+                                 dtype=np.int64)
+        view_positions[view_ids] = np.arange(len(view_ids))
+        return view_positions[ids]
+
+    def _write_cells(self, ids, columns, values, view_positions):
+        """
+        Write values to the cells given by the ``qgrid_unfiltered_index``
+        of their rows and the names of their columns, one column at a time.
+        The cells are written to ``_unfiltered_df``, and to ``_df`` for the
+        rows that are in the view, given their ``view_positions`` in ``_df``
+        (-1 for rows that aren't in it).  If a column can't be written, the
+        columns that were already written are restored before the error is
+        raised.  Returns the previous values of the cells.
+        """
+        old_values = self._get_cell_values(ids, columns)
+        positions = self._unfiltered_positions[ids]
+
+        def write_column(col_name, is_col, col_values):
+            col_loc = self._unfiltered_df.columns.get_loc(col_name)
+            # writing an object array would turn the column into an object
+            # column, so values which can be converted to the column's type
+            # without loss are converted
+            col_series = self._unfiltered_df.iloc[:, col_loc]
+            dtype = col_series.dtype
+            if hasattr(col_series, 'cat'):
+                typed_values = pd.Categorical(
+                    col_values,
+                    categories=col_series.cat.categories,
+                    ordered=col_series.cat.ordered
+                )
+                # values that aren't categories would become missing
+                if ((typed_values.codes >= 0) |
+                        pd.isnull(col_values)).all():
+                    col_values = typed_values
+            elif dtype.kind == 'M':
+                try:
+                    typed_values = pd.DatetimeIndex(col_values)
+                except (ValueError, TypeError):
+                    typed_values = None
+                # naive dates aren't written to a column with a time zone,
+                # or the other way around
+                if typed_values is not None and typed_values.dtype == dtype:
+                    col_values = typed_values
+            elif dtype.kind in 'biuf':
+                typed_values = np.array(col_values.tolist())
+                if np.can_cast(typed_values.dtype, dtype, casting='safe'):
+                    col_values = typed_values.astype(dtype)
+            self._unfiltered_df.iloc[positions[is_col], col_loc] = col_values
+            in_view = view_positions[is_col] >= 0
+            self._df.iloc[
+                view_positions[is_col][in_view],
+                self._df.columns.get_loc(col_name)
+            ] = col_values[in_view]
+
+        edited_columns = pd.unique(columns)
+        written = []
+        try:
+            for col_name in edited_columns:
+                is_col = np.flatnonzero(columns == col_name)
+                write_column(col_name, is_col, values[is_col])
+                written.append((col_name, is_col))
+        except (ValueError, TypeError):
+            for col_name, is_col in written:
+                write_column(col_name, is_col, old_values[is_col])
+            raise
+        finally:
+            self._clear_column_caches(list(edited_columns))
+        return old_values
+
+    def _record_edit(self, ids, columns, old_values):
+        self._edit_tracker.track_edit(ids, columns, old_values)
+        # the new values are read back from the DataFrame, so that they're
+        # recorded after being converted to the type of their column
+        self._journal.record({
+            'kind': 'edit',
+            'cells': len(ids),
+            'ids': ids,
+            'columns': self._journal.column_codes(columns),
+            'old': old_values,
+            'new': self._get_cell_values(ids, columns)
+        })
+
+    def _coerce_values(self, col_name, values):
+        """
+        Convert values for a column, such as strings that were pasted into
+        the grid, to the type of the column.  All of the values are
+        converted at once, and a ValueError is raised if any of them can't
+        be converted.  Blank strings become missing values, where the
+        column can hold them.
+        """
+        col_series = self._unfiltered_df[col_name]
+        dtype = col_series.dtype
+        values = pd.Series(values, dtype=object)
+        as_strings = values.astype(str)
+        is_blank = values.isnull().values | \
+            (as_strings.str.strip() == '').values
+
+        if hasattr(col_series, 'cat'):
+            values[is_blank] = np.nan
+            is_unknown = ~is_blank & \
+                ~values.isin(col_series.cat.categories).values
+            if is_unknown.any():
+                raise ValueError(
+                    "'%s' isn't one of the categories of column '%s'" %
+                    (values[is_unknown].iloc[0], col_name)
+                )
+            return values.values
+        elif dtype.kind == 'b':
+            lowered = as_strings.str.lower()
+            is_true = lowered.isin(['true', '1']).values
+            is_valid = is_true | lowered.isin(['false', '0']).values
+            if not is_valid.all():
+                raise ValueError(
+                    "'%s' isn't a valid value for boolean column '%s'" %
+                    (values[~is_valid].iloc[0], col_name)
+                )
+            return is_true
+        elif dtype.kind in 'iuf':
+            values[is_blank] = np.nan
+            converted = pd.to_numeric(values).values
+            if dtype.kind in 'iu':
+                if is_blank.any() or (converted % 1 != 0).any():
+                    raise ValueError(
+                        "Column '%s' can only hold whole numbers" % col_name
+                    )
+            return converted.astype(dtype)
+        elif dtype.kind == 'M':
+            values[is_blank] = None
+            converted = pd.Series(pd.to_datetime(values))
+            tz = getattr(dtype, 'tz', None)
+            if tz is not None:
+                if converted.dt.tz is None:
+                    converted = converted.dt.tz_localize(tz)
+                else:
+                    converted = converted.dt.tz_convert(tz)
+            return np.asarray(converted, dtype=object)
+        return values.values
+
+    def _edit_range(self, row_start, row_end, columns, values):
+        """
+        Write a block of values to the rows of the view from ``row_start``
+        up to (but not including) ``row_end``, in the given columns, as a
+        single edit.  ``values`` is a list with a list of values for each
+        row, which is repeated if the range has more rows than that (so a
+        single row of values fills the whole range).  Every value is
+        converted to the type of its column before anything is written, so
+        if any of them are invalid the DataFrame is left unchanged and a
+        ValueError is raised.  Returns the indices of the edited rows, the
+        edited columns, and the old and new values of the cells.
+        """
+        if not 0 <= row_start < row_end <= len(self._df):
+            raise ValueError("Rows %s to %s aren't in the grid" %
+                             (row_start, row_end - 1))
+        internal_columns = self._get_internal_columns()
+        for col_name in columns:
+            if col_name not in self._df.columns or \
+                    col_name in internal_columns:
+                raise ValueError("Column '%s' can't be edited" % col_name)
+            column_definition = self.column_definitions.get(col_name, {})
+            if column_definition.get('editable', True) is False:
+                raise ValueError("Column '%s' isn't editable" % col_name)
+        if len(values) == 0 or \
+                any(len(row) != len(columns) for row in values):
+            raise ValueError("Every row of values must have a value for "
+                             "each of the %s columns" % len(columns))
+
+        if self.row_edit_callback is not None:
+            for _, row in self._df.iloc[row_start:row_end].iterrows():
+                if not self.row_edit_callback(row):
+                    raise ValueError("Row %s isn't editable" % (row.name,))
+
+        n_rows = row_end - row_start
+        value_rows = np.empty((len(values), len(columns)), dtype=object)
+        value_rows[:] = values
+        value_rows = value_rows[np.arange(n_rows) % len(values)]
+
+        new_values = np.empty(n_rows * len(columns), dtype=object)
+        for i, col_name in enumerate(columns):
+            new_values[i * n_rows:(i + 1) * n_rows] = \
+                self._coerce_values(col_name, value_rows[:, i])
+
+        view_positions = np.tile(np.arange(row_start, row_end), len(columns))
+        ids = np.asarray(self._df[self._index_col_name].values,
+                         dtype=np.int64)[view_positions]
+        edited_columns = np.repeat(np.array(columns, dtype=object), n_rows)
+        old_values = self._write_cells(ids, edited_columns, new_values,
+                                       view_positions)
+        self._record_edit(ids, edited_columns, old_values)
+        self._patch_cells(view_positions, edited_columns)
+        indices = np.asarray(self._df.index[view_positions], dtype=object)
+        return indices, edited_columns, old_values, new_values
+
+    def undo(self):
+        """
+        Undo the most recent edit made to the grid, whether it was made in
+        the grid interface or with one of the api methods such as
+        ``edit_cell``, ``add_rows`` or ``remove_rows``.  Edits that changed
+        many cells or rows at once are undone in a single step.  Results in
+        a ``cells_edited``, ``rows_added`` or ``row_removed`` event whose
+        ``source`` is ``undo``.
+
+        Returns
+        -------
+        bool
+            False if there were no edits to undo, otherwise True.
+
+        See Also
+        --------
+        QgridWidget.redo:
+            The method for redoing an edit that was undone.
+        """
+        return self._apply_journal_entry('undo')
+
+    def redo(self):
+        """
+        Redo the edit that was most recently undone with ``undo``, provided
+        that no other edits have been made since.  Results in a
+        ``cells_edited``, ``rows_added`` or ``row_removed`` event whose
+        ``source`` is ``redo``.
+
+        Returns
+        -------
+        bool
+            False if there were no edits to redo, otherwise True.
+
+        See Also
+        --------
+        QgridWidget.undo:
+            The method for undoing an edit.
+        """
+        return self._apply_journal_entry('redo')
+
+    def _apply_journal_entry(self, action):
+        self._wait_for_view()
+        journal = self._journal
+        if action == 'undo':
+            entries, inverse_entries = \
+                journal.undo_entries, journal.redo_entries
+        else:
+            entries, inverse_entries = \
+                journal.redo_entries, journal.undo_entries
+        if len(entries) == 0:
+            return False
+
+        entry = journal.pop(entries)
+        if entry['kind'] == 'edit':
+            columns = journal.column_names(entry['columns'])
+            view_positions = self._get_view_positions_of(entry['ids'])
+            self._write_cells(entry['ids'], columns, entry['old'],
+                              view_positions)
+            self._edit_tracker.track_edit(entry['ids'], columns,
+                                          entry['new'])
+            inverse = dict(entry, old=entry['new'], new=entry['old'])
+            event = {
+                'name': 'cells_edited',
+                'index': np.asarray(self._unfiltered_df.index[
+                    self._unfiltered_positions[entry['ids']]
+                ], dtype=object),
+                'column': columns,
+                'old': entry['new'],
+                'new': entry['old']
+            }
+            self._patch_cells(view_positions, columns)
+        elif entry['kind'] == 'add':
+            positions = np.sort(self._unfiltered_positions[entry['ids']])
+            indices = self._unfiltered_df.index[positions].tolist()
+            view_ids = np.asarray(self._df[self._index_col_name].values,
+                                  dtype=np.int64)
+            inverse = self._drop_rows(np.isin(view_ids, entry['ids']),
+                                      entry['ids'])
+            event = {'name': 'row_removed', 'indices': indices}
+        else:
+            inverse = self._restore_rows(entry)
+            event = {'name': 'rows_added',
+                     'indices': entry['rows'].index.tolist()}
+
+        journal.push(inverse_entries, inverse)
+        event['source'] = action
+        self._notify_listeners(event)
+        return True
+
     def remove_rows(self, rows=None):
         """
         Remove a row (or rows) from the DataFrame.  The indices of the
@@ -1743,6 +4105,7 @@ class QgridWidget(widgets.DOMWidget):
         QgridWidget.remove_row:
             Alias for this method.
         """
+        self._wait_for_view()
         row_indices = self._remove_rows(rows=rows)
         self._notify_listeners({
             'name': 'row_removed',
@@ -1760,17 +4123,124 @@ class QgridWidget(widgets.DOMWidget):
 
     def _remove_rows(self, rows=None):
         if rows is not None:
-            selected_names = rows
+            is_removed = self._df.index.isin(rows)
+            rows_index = _as_index(rows)
+            missing = ~rows_index.isin(self._df.index)
+            if missing.any():
+                raise KeyError(
+                    '{} not found in the grid'.format(
+                        list(rows_index[missing])
+                    )
+                )
         else:
-            selected_names = \
-                list(map(lambda x: self._df.iloc[x].name, self._selected_rows))
+            is_removed = _ranges_to_mask(self._get_selection_ranges(),
+                                         len(self._df))
 
-        self._df.drop(selected_names, inplace=True)
-        self._unfiltered_df.drop(selected_names, inplace=True)
-        self._selected_rows = []
-        self._update_table(triggered_by='remove_row')
+        selected_names = self._df.index[is_removed].tolist()
+        removed_ids = np.asarray(self._df[self._index_col_name].values,
+                                 dtype=np.int64)[is_removed]
+        self._journal.record(self._drop_rows(is_removed, removed_ids))
         return selected_names
 
+    def _drop_rows(self, is_removed, removed_ids):
+        """
+        Remove the rows with the given ``qgrid_unfiltered_index`` values,
+        given a boolean mask over ``_df`` of the ones that are in the view.
+        Returns the journal entry which restores the rows.
+        """
+        positions = np.sort(self._unfiltered_positions[removed_ids])
+        restore_entry = {
+            'kind': 'remove',
+            'rows': self._unfiltered_df.take(positions),
+            'positions': positions
+        }
+        restore_entry['cells'] = restore_entry['rows'].size
+        removed_rows = restore_entry['rows']
+        self._edit_tracker.track_removal(
+            np.asarray(removed_rows[self._index_col_name].values,
+                       dtype=np.int64),
+            np.asarray(removed_rows.index, dtype=object)
+        )
+
+        # taking the remaining rows from _df leaves them in the order they're
+        # sorted in, so the view doesn't need to be sorted or filtered again
+        self._df = self._df.take(np.flatnonzero(~is_removed))
+
+        # the removed rows are found in _unfiltered_df by their position
+        keep = np.ones(len(self._unfiltered_df), dtype=bool)
+        keep[positions] = False
+        self._take_unfiltered_rows(keep)
+        self._selection_ranges = np.empty((0, 2), dtype=np.int64)
+        self._update_table(triggered_by='remove_row')
+        return restore_entry
+
+    def _restore_rows(self, entry):
+        """
+        Put rows that were removed by ``_drop_rows`` back where they were in
+        ``_unfiltered_df``, given the journal entry that it returned, and
+        then filter and sort the view again, since the filters and the sort
+        may have changed since the rows were removed.  Returns the journal
+        entry which removes the rows again.
+        """
+        rows = entry['rows']
+        ids = np.asarray(rows[self._index_col_name].values, dtype=np.int64)
+        is_inserted = np.zeros(len(self._unfiltered_df) + len(rows),
+                               dtype=bool)
+        is_inserted[entry['positions']] = True
+        order = np.empty(len(is_inserted), dtype=np.int64)
+        order[~is_inserted] = np.arange(len(self._unfiltered_df))
+        order[is_inserted] = np.arange(len(self._unfiltered_df),
+                                       len(is_inserted))
+        self._unfiltered_df = pd.concat([self._unfiltered_df, rows]) \
+            .take(order)
+
+        self._update_unfiltered_positions()
+        self._clear_column_caches()
+        self._update_filters(_CancellationToken())
+        self._update_sort()
+        self._finish_pending_sort()
+
+        view_positions = self._get_view_positions_of(ids)
+        view_positions = view_positions[view_positions >= 0]
+        self._selection_ranges = np.empty((0, 2), dtype=np.int64)
+        self._update_table(
+            triggered_by='add_row',
+            scroll_to_row=int(view_positions.min())
+            if len(view_positions) > 0 else None,
+            fire_data_change_event=True
+        )
+        return {'kind': 'add', 'cells': len(ids), 'ids': ids}
+
+    def _take_unfiltered_rows(self, keep):
+        """
+        Drop the rows of ``_unfiltered_df`` for which the boolean ``keep``
+        mask is False.  Sort keys and filter masks are computed per row, so
+        rather than being discarded they're cut down with the same mask,
+        which means the current filters and sort don't have to be
+        recomputed from scratch.
+        """
+        sort_keys = dict(
+            (col_name, (codes[keep], uniques))
+            for col_name, (codes, uniques) in self._sort_key_cache.items()
+        )
+        filter_masks = dict(
+            (col_name, (filter_key, None if mask is None else mask[keep]))
+            for col_name, (filter_key, mask) in self._filter_masks.items()
+        )
+        expression_mask = None
+        if self._filter_expression is not None and \
+                self._filter_expression.mask is not None:
+            expression_mask = self._filter_expression.mask[keep]
+
+        self._unfiltered_df = self._unfiltered_df[keep]
+        self._update_unfiltered_positions()
+        self._clear_column_caches()
+
+        self._sort_key_cache = sort_keys
+        self._filter_masks = filter_masks
+        if expression_mask is not None:
+            self._filter_expression.mask = expression_mask
+
     def change_selection(self, rows=[]):
         """
         Select a row (or rows) in the UI.  The indices of the
@@ -1784,34 +4254,291 @@ class QgridWidget(widgets.DOMWidget):
             value in each tuple corresponding to a level of the MultiIndex.
             The default value of ``[]`` results in the no rows being
             selected (i.e. it clears the selection).
+
+        Raises
+        ------
+        KeyError
+            If any of the indices aren't in the grid.
         """
-        new_selection = \
-            list(map(lambda x: self._df.index.get_loc(x), rows))
+        self._wait_for_view()
+        rows_index = _as_index(rows)
+        new_selection = self._df.index.get_indexer_for(rows_index)
+        if (new_selection < 0).any():
+            raise KeyError(
+                '{} not found in the grid'.format(
+                    list(rows_index[~rows_index.isin(self._df.index)])
+                )
+            )
 
-        self._change_selection(new_selection, 'api', send_msg_to_js=True)
+        self._change_selection(_rows_to_ranges(new_selection), 'api',
+                               send_msg_to_js=True)
 
-    def _change_selection(self, rows, source, send_msg_to_js=False):
-        old_selection = self._selected_rows
-        self._selected_rows = rows
+    def select_all(self):
+        """
+        Select every row that's shown in the grid, which (when any filters
+        are active) is every row that passes the filters.  The selection is
+        stored as a single range of rows, so this is cheap even for very
+        large DataFrames.
+        """
+        self._wait_for_view()
+        self._change_selection(_normalize_ranges([[0, len(self._df)]]),
+                               'api', send_msg_to_js=True)
+
+    def _change_selection(self, ranges, source, send_msg_to_js=False):
+        old_ranges = self._selection_ranges
+        self._selection_ranges = ranges
 
         # if the selection didn't change, just return without firing
         # the event
-        if old_selection == self._selected_rows:
+        if np.array_equal(old_ranges, ranges):
             return
 
         if send_msg_to_js:
             data_to_send = {
                 'type': 'change_selection',
-                'rows': rows
+                'ranges': ranges.tolist()
             }
             self.send(data_to_send)
 
-        self._notify_listeners({
-            'name': 'selection_changed',
-            'old': old_selection,
-            'new': self._selected_rows,
-            'source': source
-        })
+        # the event lists every selected row, so it's only built when
+        # someone is listening for it
+        if handlers.has_listeners('selection_changed') or \
+                self._handlers.has_listeners('selection_changed'):
+            self._notify_listeners({
+                'name': 'selection_changed',
+                'old': _ranges_to_rows(old_ranges).tolist(),
+                'new': _ranges_to_rows(ranges).tolist(),
+                'source': source
+            })
+
+    def set_state(self, filters=None, sort=_UNCHANGED):
+        """
+        Change the filters and the sort of the grid at once.  All of the
+        changes are validated before any of them are applied, and then the
+        rows shown by the grid are recomputed (and sent to the browser) a
+        single time, so restoring a saved layout costs about as much as
+        changing one filter.
+
+        Parameters
+        ----------
+        filters : dict, optional
+            A dict which maps column names to the filters for those columns,
+            or to None to remove a column's filter.  The filters on columns
+            that aren't in the dict are left as they are.  The filter for a
+            column depends on its type:
+
+            * numeric and date columns: ``{'min': ..., 'max': ...}``, where
+              either bound can be omitted or None.  Dates can be given as
+              anything that ``pd.Timestamp`` accepts.
+            * boolean columns: ``{'selected': True}`` or
+              ``{'selected': False}``.
+            * other columns: ``{'selected': [...]}`` to only show the rows
+              that contain one of the given values, or ``{'excluded': [...]}``
+              to hide them.
+
+        sort : str, tuple, list, or None, optional
+            The name of the column to sort by, a ``(column, ascending)``
+            tuple, or a list of names and/or tuples to sort by multiple
+            columns, the first of which takes precedence.  Columns are sorted
+            in ascending order unless specified otherwise.  None or an empty
+            list clears the sort.  If omitted, the sort is left as it is.
+
+        Raises
+        ------
+        ValueError
+            If any of the filters or sort columns are invalid, in which case
+            none of the changes are applied.
+        """
+        self._wait_for_view()
+        filter_infos = [
+            (col_name,) + self._get_state_filter_info(col_name, col_filter)
+            for col_name, col_filter in (filters or {}).items()
+        ]
+        sort_columns = None
+        if sort is not _UNCHANGED:
+            sort_columns = self._get_state_sort_columns(sort)
+
+        events = []
+        if len(filter_infos) > 0:
+            columns = self._columns.copy()
+            for col_name, filter_info, filter_table in filter_infos:
+                col_info = dict(columns[col_name])
+                if filter_info is None:
+                    col_info.pop('filter_info', None)
+                else:
+                    col_info['filter_info'] = filter_info
+                    # period columns are filtered by their timestamps
+                    if col_name in self._period_columns:
+                        self._initialize_sort_column(col_name)
+                if filter_table is not None:
+                    self._filter_tables[col_name] = filter_table
+                    self._filter_table_positions.pop(col_name, None)
+                columns[col_name] = col_info
+                events.append({
+                    'name': 'filter_changed',
+                    'column': col_name
+                })
+            self._columns = columns
+            self._filters_changed = True
+
+        if sort_columns is not None:
+            old_column = self._sort_field
+            old_ascending = self._sort_ascending
+            self._sort_columns = [list(sort) for sort in sort_columns]
+            if len(sort_columns) > 0:
+                self._sort_field, self._sort_ascending = sort_columns[0]
+            else:
+                # the rows go back to the order they're in unsorted, which
+                # is the order of _unfiltered_df
+                self._sort_field, self._sort_ascending = None, True
+                self._disable_grouping = False
+                self._filters_changed = True
+            events.append({
+                'name': 'sort_changed',
+                'old': {
+                    'column': old_column,
+                    'ascending': old_ascending
+                },
+                'new': {
+                    'column': self._sort_field,
+                    'ascending': self._sort_ascending
+                }
+            })
+
+        if len(events) > 0:
+            self._schedule_view_update('set_state', events)
+
+    def _get_state_filter_info(self, col_name, col_filter):
+        # convert a filter that was passed to set_state into the format that
+        # the filter controls use, along with the filter table that text
+        # filters refer to (text filters identify their values by position)
+        if col_name not in self._columns or col_name == self._index_col_name:
+            raise ValueError("Can't filter unknown column '%s'" % col_name)
+        if col_filter is None:
+            return None, None
+
+        col_type = self._columns[col_name]['type']
+        if col_type in ['integer', 'number', 'datetime']:
+            allowed_keys = set(['min', 'max'])
+        elif col_type == 'boolean':
+            allowed_keys = set(['selected'])
+        else:
+            allowed_keys = set(['selected', 'excluded'])
+        if not isinstance(col_filter, dict) or len(col_filter) == 0 or \
+                not allowed_keys.issuperset(col_filter) or \
+                ('selected' in col_filter and 'excluded' in col_filter):
+            raise ValueError(
+                "Invalid filter for column '%s': %r" % (col_name, col_filter)
+            )
+
+        def invalid_value(key):
+            return ValueError(
+                "Invalid '%s' value for column '%s': %r" %
+                (key, col_name, col_filter[key])
+            )
+
+        filter_info = {'field': col_name}
+        if col_type == 'datetime':
+            def to_ms(key):
+                value = col_filter.get(key)
+                if value is None:
+                    return None
+                try:
+                    timestamp = pd.Timestamp(value)
+                except (ValueError, TypeError):
+                    raise invalid_value(key)
+                if isinstance(value, (bool, np.bool_)) or \
+                        pd.isnull(timestamp):
+                    raise invalid_value(key)
+                return int(timestamp.value // 10 ** 6)
+            filter_info['type'] = 'date'
+            filter_info['min'] = to_ms('min')
+            filter_info['max'] = to_ms('max')
+        elif col_type in ['integer', 'number']:
+            filter_info['type'] = 'slider'
+            for key in ['min', 'max']:
+                value = col_filter.get(key)
+                if value is not None and (
+                        not isinstance(value, Number) or
+                        isinstance(value, (bool, np.bool_)) or
+                        pd.isnull(value)):
+                    raise invalid_value(key)
+                filter_info[key] = value
+        elif col_type == 'boolean':
+            if not isinstance(col_filter['selected'], (bool, np.bool_)):
+                raise invalid_value('selected')
+            filter_info['type'] = 'boolean'
+            filter_info['selected'] = bool(col_filter['selected'])
+        else:
+            key = 'selected' if 'selected' in col_filter else 'excluded'
+            if isinstance(col_filter[key], string_types) or \
+                    not hasattr(col_filter[key], '__iter__'):
+                raise invalid_value(key)
+            values = list(col_filter[key])
+            filter_table = np.empty(len(values), dtype=object)
+            filter_table[:] = values
+            indices = list(range(len(values)))
+            filter_info['type'] = 'text'
+            if 'selected' in col_filter:
+                filter_info['selected'] = indices
+                filter_info['excluded'] = []
+            else:
+                filter_info['selected'] = 'all'
+                filter_info['excluded'] = indices
+            return filter_info, filter_table
+        return filter_info, None
+
+    def _get_state_sort_columns(self, sort):
+        # normalize the sort that was passed to set_state into a list of
+        # (column, ascending) tuples, which is empty to clear the sort
+        if sort is None:
+            return []
+        if isinstance(sort, (string_types, tuple)):
+            sort = [sort]
+        sort_columns = []
+        for col_sort in sort:
+            if isinstance(col_sort, tuple):
+                col_name, ascending = col_sort
+            else:
+                col_name, ascending = col_sort, True
+            if col_name not in self._columns or \
+                    col_name == self._index_col_name:
+                raise ValueError("Can't sort by unknown column '%s'" %
+                                 col_name)
+            sort_columns.append((col_name, bool(ascending)))
+        return sort_columns
+
+    def set_filter_expression(self, expression):
+        """
+        Filter the rows of the grid with an expression, in addition to any
+        filters that are set on individual columns.  Pass None (or an empty
+        string) to remove the current expression.
+
+        Parameters
+        ----------
+        expression : str
+            An expression such as ``price > 100 and venue in ('X', 'Y')``,
+            written with Python syntax.  Columns (including index columns)
+            are referred to by name, and can be compared with each other or
+            with constants, tested for membership in a list of constants
+            with ``in`` and ``not in``, combined with arithmetic operators,
+            and the resulting conditions can be combined with ``and``,
+            ``or`` and ``not``.  Dates can be compared with strings such as
+            ``'2018-01-01'``.
+
+        Raises
+        ------
+        ValueError
+            If the expression can't be parsed, refers to columns that don't
+            exist, or compares columns with values of the wrong type.
+        """
+        self._wait_for_view()
+        self._set_filter_expression(expression)
+        self._schedule_view_update('change_filter', [{
+            'name': 'filter_changed',
+            'column': None,
+            'expression': expression
+        }])
 
     def toggle_editable(self):
         """
@@ -1,8 +1,12 @@
 from qgrid import QgridWidget, set_defaults, show_grid, on as qgrid_on
+from qgrid import grid
+from qgrid.grid import PAGE_SIZE
 from traitlets import All
 import numpy as np
 import pandas as pd
 import json
+import threading
+import pytest
 
 
 def create_df():
@@ -764,3 +768,1252 @@ def test_edit_cell():
             "source": "api",
         },
     ]
+
+
+def test_edit_cell_duplicate_index_labels():
+    df = pd.DataFrame({"A": [1, 2, 3], "B": ["x", "y", "z"]},
+                      index=[7, 7, 8])
+    q = QgridWidget(df=df)
+    q.set_state(filters={"A": {"min": 2}})
+
+    # only the row with the label that's in the view is edited, not the
+    # filtered out row with the same label
+    q.edit_cell(7, "B", "w")
+    assert list(q._df["B"]) == ["w", "z"]
+    assert list(q._unfiltered_df["B"]) == ["x", "w", "z"]
+
+
+def test_multi_column_sort():
+    df = pd.DataFrame(
+        {
+            "A": [2, 1, 2, 1, 2],
+            "B": ["x", "y", "y", "x", np.nan],
+            "C": [5.0, 4.0, 3.0, 2.0, 1.0],
+        }
+    )
+    widget = QgridWidget(df=df)
+    event_history = init_event_history("sort_changed", widget=widget)
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": True}
+    )
+    widget._handle_qgrid_msg_helper(
+        {
+            "type": "change_sort",
+            "sort_field": "B",
+            "sort_ascending": False,
+            "multi": True,
+        }
+    )
+    assert widget._sort_columns == [["A", True], ["B", False]]
+    assert list(widget._df.index) == [1, 3, 2, 0, 4]
+    assert set(widget._sort_key_cache) == {"A", "B"}
+
+    # shift-clicking a column that's already sorted flips its direction
+    widget._handle_qgrid_msg_helper(
+        {
+            "type": "change_sort",
+            "sort_field": "A",
+            "sort_ascending": False,
+            "multi": True,
+        }
+    )
+    assert widget._sort_columns == [["A", False], ["B", False]]
+    assert list(widget._df.index) == [2, 0, 4, 1, 3]
+
+    # a regular click replaces the multi-column sort
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "C", "sort_ascending": True}
+    )
+    assert widget._sort_columns == [["C", True]]
+    assert list(widget._df.index) == [4, 3, 2, 1, 0]
+    assert event_history[-1] == {
+        "name": "sort_changed",
+        "old": {"column": "A", "ascending": False},
+        "new": {"column": "C", "ascending": True},
+    }
+
+
+def test_top_k_positions():
+    keys = [np.random.randint(0, 5, 500), np.random.randint(0, 3, 500)]
+    top = QgridWidget._top_k_positions(keys, [5, 3], 50)
+    assert list(top) == list(np.lexsort(keys)[:50])
+
+
+def test_lazy_sort(monkeypatch):
+    monkeypatch.setattr(grid, "LAZY_SORT_MIN_ROWS", 1000)
+    df = create_large_df(size=5000)
+    df["E"] = np.random.randint(0, 10, size=5000)
+    expected = df.sort_values(["E", "A"], ascending=[True, False],
+                              kind="mergesort")
+
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "E", "sort_ascending": True}
+    )
+    widget._handle_qgrid_msg_helper(
+        {
+            "type": "change_sort",
+            "sort_field": "A",
+            "sort_ascending": False,
+            "multi": True,
+        }
+    )
+
+    # the first page is rendered from the partial sort...
+    grid_data = json.loads(widget._df_json)["data"]
+    assert [row["index"] for row in grid_data] == \
+        list(expected.index[:PAGE_SIZE])
+
+    # the sort thread doesn't swap in the sorted rows itself, and columns
+    # added to the view in the meantime are kept when they're swapped in.
+    # (the sort by "E" alone may have been swapped in before the second
+    # message was handled, so the rows aren't necessarily in df's order)
+    unsorted_index = list(widget._df.index)
+    widget._df["extra"] = 1
+    widget._pending_sort.thread.join()
+    assert list(widget._df.index) == unsorted_index
+
+    # ...and scrolling past it waits for the full sort to be swapped in
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_viewport", "top": 4000, "bottom": 4012}
+    )
+    assert widget._pending_sort is None
+    assert list(widget._df.index) == list(expected.index)
+    assert (widget._df["extra"] == 1).all()
+    widget._df = widget._df.drop("extra", axis=1)
+    assert list(widget.get_changed_df().index) == list(expected.index)
+
+
+def test_mixed_type_column_sort_key():
+    df = pd.DataFrame({"A": [1.2, "xy", 4, None, "ab", 2]})
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": True}
+    )
+
+    # numbers sort before strings, and missing values sort last
+    assert list(widget._df.index) == [0, 5, 2, 4, 1, 3]
+    assert widget._sort_helper_columns == {}
+    assert list(widget._unfiltered_df.columns) == \
+        ["qgrid_unfiltered_index", "A"]
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "show_filter_dropdown", "field": "A", "search_val": None}
+    )
+    assert list(widget._filter_tables["A"][:5]) == [1.2, 2, 4, "ab", "xy"]
+    assert widget._columns["A"]["values"][:5] == \
+        ["1.2", "2", "4", "ab", "xy"]
+
+    widget._handle_qgrid_msg_helper(
+        {
+            "type": "change_filter",
+            "field": "A",
+            "filter_info": {
+                "field": "A",
+                "type": "text",
+                "selected": [1, 4],
+                "excluded": [],
+            },
+        }
+    )
+    assert list(widget._df.index) == [5, 1]
+
+
+def test_background_view_update(monkeypatch):
+    monkeypatch.setattr(grid, "BACKGROUND_MIN_ROWS", 100)
+    df = create_large_df(size=1000)
+    widget = QgridWidget(df=df)
+    sent = []
+    widget.send = lambda content, buffers=None: sent.append(content)
+    event_history = init_event_history(
+        ["filter_changed", "sort_changed"], widget=widget
+    )
+
+    # hold the lock so that the filter update is still waiting to run when
+    # the sort request arrives and cancels it
+    with widget._view_lock:
+        widget._handle_qgrid_msg_helper(
+            {
+                "type": "change_filter",
+                "field": "A",
+                "filter_info": {
+                    "field": "A",
+                    "type": "slider",
+                    "min": 0,
+                    "max": None,
+                },
+            }
+        )
+        widget._handle_qgrid_msg_helper(
+            {"type": "change_sort", "sort_field": "B", "sort_ascending": True}
+        )
+    widget._wait_for_view()
+
+    expected = df[df["A"] >= 0].sort_values("B")
+    assert list(widget.get_changed_df().index) == list(expected.index)
+    assert [e["name"] for e in event_history] == \
+        ["filter_changed", "sort_changed"]
+
+    progress = [
+        msg["state"] for msg in sent if msg["type"] == "operation_progress"
+    ]
+    assert progress.count("started") == 2
+    assert progress[-1] == "finished"
+    assert progress.count("finished") == 1
+
+
+def test_background_view_update_is_swapped_in_on_kernel_thread(monkeypatch):
+    monkeypatch.setattr(grid, "BACKGROUND_MIN_ROWS", 100)
+    df = create_large_df(size=1000)
+    widget = QgridWidget(df=df)
+    sent = []
+    widget.send = lambda content, buffers=None: sent.append(content)
+    listener_threads = []
+    widget.on("sort_changed", lambda event, qgrid_widget:
+              listener_threads.append(threading.current_thread()))
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "B", "sort_ascending": True}
+    )
+    widget._view_thread.join()
+
+    # the worker thread leaves the sorted view for the kernel's thread
+    assert list(widget._df.index) == list(df.index)
+    assert listener_threads == []
+    assert [msg["type"] for msg in sent] == ["operation_progress"]
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_viewport", "top": 0, "bottom": 20}
+    )
+    assert list(widget._df.index) == list(df.sort_values("B").index)
+    assert listener_threads == [threading.current_thread()]
+    assert [msg.get("state") for msg in sent
+            if msg["type"] == "operation_progress"] == ["started", "finished"]
+
+
+def test_filter_masks_are_cached_per_column():
+    df = create_large_df(size=100)
+    widget = QgridWidget(df=df)
+
+    def change_slider_filter(col_name, min_val):
+        widget._handle_qgrid_msg_helper(
+            {
+                "type": "change_filter",
+                "field": col_name,
+                "filter_info": {
+                    "field": col_name,
+                    "type": "slider",
+                    "min": min_val,
+                    "max": None,
+                },
+            }
+        )
+
+    change_slider_filter("A", 0)
+    mask_a = widget._filter_masks["A"][1]
+
+    # changing the filter on another column reuses the mask for "A"...
+    change_slider_filter("B", -0.5)
+    assert widget._filter_masks["A"][1] is mask_a
+    mask_b = widget._filter_masks["B"][1]
+    expected = df[(df["A"] >= 0) & (df["B"] >= -0.5)]
+    assert list(widget._df.index) == list(expected.index)
+
+    # ...while changing the filter on "B" recomputes only its mask
+    change_slider_filter("B", 0.5)
+    assert widget._filter_masks["A"][1] is mask_a
+    assert widget._filter_masks["B"][1] is not mask_b
+    expected = df[(df["A"] >= 0) & (df["B"] >= 0.5)]
+    assert list(widget._df.index) == list(expected.index)
+
+    # editing a column discards its cached mask
+    widget.edit_cell(expected.index[0], "B", -1.0)
+    assert "B" not in widget._filter_masks
+    assert "A" in widget._filter_masks
+
+
+def test_value_index_mask():
+    tickers = np.array(["AAPL", "MSFT", "GOOG", "IBM", None], dtype=object)
+    df = pd.DataFrame({"ticker": tickers[np.random.randint(0, 5, 1000)]})
+    widget = QgridWidget(df=df)
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "show_filter_dropdown", "field": "ticker", "search_val": None}
+    )
+    assert list(widget._filter_tables["ticker"][:4]) == \
+        ["AAPL", "GOOG", "IBM", "MSFT"]
+    assert np.isnan(widget._filter_tables["ticker"][4])
+    assert widget._columns["ticker"]["index_memory"] == 0
+
+    for values in [["IBM"], ["MSFT", "AAPL"], [np.nan, "GOOG"], []]:
+        for exclude in [False, True]:
+            mask = widget._get_value_index_mask("ticker", values, exclude)
+            # the dropdown's entry for missing values matches all of them
+            expected = df["ticker"].isin(values).values | (
+                df["ticker"].isnull().values & pd.isnull(values).any()
+            )
+            if exclude:
+                expected = ~expected
+            assert (mask == expected).all()
+
+    widget._handle_qgrid_msg_helper(
+        {
+            "type": "change_filter",
+            "field": "ticker",
+            "filter_info": {
+                "field": "ticker",
+                "type": "text",
+                "selected": "all",
+                "excluded": [0, 4],
+            },
+        }
+    )
+    expected = df[~df["ticker"].isin(["AAPL", None])]
+    assert list(widget._df.index) == list(expected.index)
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "show_filter_dropdown", "field": "ticker", "search_val": None}
+    )
+    assert widget._columns["ticker"]["index_memory"] > 0
+
+
+def test_substring_index_search():
+    values = ["Apple", "pineapple", "APPLICATION", "banana", "", "nan", np.nan]
+    index = grid._SubstringIndex(values)
+    for query in ["", "a", "ap", "App", "ppl", "pple", "apple", "NaN", "xyz"]:
+        expected = [
+            i for i, value in enumerate(values)
+            if query.lower() in grid.stringify(value).lower()
+        ]
+        assert list(index.search(query)) == expected
+
+
+def test_filter_dropdown_search():
+    df = pd.DataFrame({"name": ["alpha", "beta", "gamma", None, "delta"]})
+    widget = QgridWidget(df=df)
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "show_filter_dropdown", "field": "name", "search_val": "ta"}
+    )
+    assert list(widget._filter_tables["name"]) == ["beta", "delta"]
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "show_filter_dropdown", "field": "name", "search_val": "ALP"}
+    )
+    assert list(widget._filter_tables["name"]) == ["alpha"]
+
+
+def test_filter_expression():
+    df = pd.DataFrame({
+        "price": [50, 150, 200, 120],
+        "venue": ["X", "Y", "Z", "X"],
+        "date": pd.date_range("2018-01-01", periods=4),
+    })
+    widget = QgridWidget(df=df)
+    event_history = init_event_history(All, widget=widget)
+
+    widget.set_filter_expression("price > 100 and venue in ('X', 'Y')")
+    assert list(widget._df.index) == [1, 3]
+    assert event_history[-1]["name"] == "filter_changed"
+    assert event_history[-1]["column"] is None
+
+    # the expression is combined with the filters on individual columns
+    widget._handle_qgrid_msg_helper({
+        "type": "change_filter",
+        "field": "price",
+        "filter_info": {
+            "field": "price",
+            "type": "slider",
+            "min": None,
+            "max": 130
+        }
+    })
+    assert list(widget._df.index) == [3]
+
+    widget.set_filter_expression("date >= '2018-01-03' and not price < 100")
+    assert list(widget._df.index) == [3]
+
+    # editing a column that the expression refers to discards its mask
+    widget.edit_cell(3, "venue", "Z")
+    assert widget._filter_expression.mask is not None
+    widget.edit_cell(3, "date", pd.Timestamp("2017-01-01"))
+    assert widget._filter_expression.mask is None
+
+    for expression in ["price > 'a'", "cost > 1", "price +", "price",
+                       "date > 5", "price in venue"]:
+        with pytest.raises(ValueError):
+            widget.set_filter_expression(expression)
+
+    widget.set_filter_expression(None)
+    assert list(widget._df.index) == [0, 3]
+
+
+def test_filter_expression_msg():
+    widget = QgridWidget(df=create_df())
+    widget._handle_qgrid_msg_helper({
+        "type": "change_filter_expression",
+        "expression": "F in ('foo', 'fox')"
+    })
+    assert list(widget._df["F"]) == ["foo", "fox"]
+    assert widget._filter_expression_text == "F in ('foo', 'fox')"
+
+
+def test_filter_dropdown_active_filter_order():
+    df = pd.DataFrame({"name": ["delta", "alpha", "gamma", "beta", "alpha"]})
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "show_filter_dropdown", "field": "name", "search_val": None}
+    )
+    assert list(widget._filter_tables["name"][:4]) == \
+        ["alpha", "beta", "delta", "gamma"]
+
+    for selected, excluded, expected_table, expected_length in [
+        ([2, 0], [], ["delta", "alpha", "beta", "gamma"], 2),
+        ("all", [1, 3], ["beta", "delta", "alpha", "gamma"], 2),
+    ]:
+        widget._handle_qgrid_msg_helper({
+            "type": "change_filter",
+            "field": "name",
+            "filter_info": {
+                "field": "name",
+                "type": "text",
+                "selected": selected,
+                "excluded": excluded
+            }
+        })
+        widget._handle_qgrid_msg_helper({
+            "type": "show_filter_dropdown",
+            "field": "name",
+            "search_val": None
+        })
+        col_info = widget._columns["name"]
+        assert list(widget._filter_tables["name"][:4]) == expected_table
+        assert col_info["values"][:4] == expected_table
+        assert col_info["selected_length"] == expected_length
+
+
+def test_filter_dropdown_value_counts():
+    df = pd.DataFrame({
+        "venue": ["X", "Y", "X", "Z", "X", None],
+        "price": [10, 20, 30, 40, 50, 60],
+        "kind": pd.Categorical(["a", "b", "a", "b", "a", "b"]),
+    })
+    widget = QgridWidget(df=df)
+
+    def show_dropdown(col_name):
+        widget._handle_qgrid_msg_helper({
+            "type": "show_filter_dropdown",
+            "field": col_name,
+            "search_val": None
+        })
+        return widget._columns[col_name]["value_counts"]
+
+    assert show_dropdown("venue") == [3, 1, 1, 1]
+    assert show_dropdown("kind") == [3, 3]
+
+    widget._handle_qgrid_msg_helper({
+        "type": "change_filter",
+        "field": "price",
+        "filter_info": {
+            "field": "price",
+            "type": "slider",
+            "min": 25,
+            "max": None
+        }
+    })
+    assert show_dropdown("venue") == [2, 1, 1]
+
+    # the column's own filter doesn't affect its counts, but the filters
+    # on the other columns do
+    widget._handle_qgrid_msg_helper({
+        "type": "change_filter",
+        "field": "venue",
+        "filter_info": {
+            "field": "venue",
+            "type": "text",
+            "selected": [0],
+            "excluded": []
+        }
+    })
+    assert show_dropdown("venue") == [2, 0, 1, 1]
+    assert show_dropdown("kind") == [2, 0]
+
+    widget.edit_cell(4, "venue", "Y")
+    assert show_dropdown("kind") == [1, 0]
+
+
+def test_range_filter_uses_sorted_index():
+    values = np.random.randint(0, 100, 1000).astype(float)
+    values[::7] = np.nan
+    dates = pd.Series(pd.date_range("2018-01-01", periods=1000, freq="h"))
+    dates[::11] = pd.NaT
+    df = pd.DataFrame({"price": values, "time": dates})
+    widget = QgridWidget(df=df)
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "show_filter_dropdown", "field": "price", "search_val": None}
+    )
+    assert "price" in widget._range_index_cache
+
+    for min_value, max_value in [(10, 20), (None, 50), (50.5, None), (3, 3)]:
+        mask = widget._get_range_mask("price", min_value, max_value)
+        expected = np.ones(len(df), dtype=bool)
+        if min_value is not None:
+            expected &= df["price"].values >= min_value
+        if max_value is not None:
+            expected &= df["price"].values <= max_value
+        assert (mask == expected).all()
+
+    start = pd.Timestamp("2018-01-10")
+    widget._handle_qgrid_msg_helper({
+        "type": "change_filter",
+        "field": "time",
+        "filter_info": {
+            "field": "time",
+            "type": "date",
+            "min": int(start.value // 10 ** 6),
+            "max": None
+        }
+    })
+    assert list(widget._df.index) == list(df[df["time"] >= start].index)
+
+
+def test_range_filter_histogram():
+    df = pd.DataFrame({
+        "price": [5.0, 1.0, 3.0, np.nan, 9.0, 3.0],
+        "time": pd.date_range("2018-01-01", periods=6, freq="D"),
+    })
+    widget = QgridWidget(df=df)
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "show_filter_dropdown", "field": "price", "search_val": None}
+    )
+    col_info = widget._columns["price"]
+    assert (col_info["slider_min"], col_info["slider_max"]) == (1, 9)
+    histogram = col_info["histogram"]
+    assert len(histogram) == grid.HISTOGRAM_BINS
+    assert sum(histogram) == 5
+    assert histogram[0] == 1 and histogram[-1] == 1
+
+    # the summary only covers the rows that pass the other filters
+    widget._handle_qgrid_msg_helper({
+        "type": "change_filter",
+        "field": "price",
+        "filter_info": {
+            "field": "price",
+            "type": "slider",
+            "min": 4,
+            "max": None
+        }
+    })
+    widget._handle_qgrid_msg_helper(
+        {"type": "show_filter_dropdown", "field": "time", "search_val": None}
+    )
+    col_info = widget._columns["time"]
+    assert col_info["filter_min"] == pd.Timestamp("2018-01-01")
+    assert col_info["filter_max"] == pd.Timestamp("2018-01-05")
+    assert sum(col_info["histogram"]) == 2
+
+
+def test_set_state():
+    df = pd.DataFrame({
+        "price": [50, 150, 200, 120, 80],
+        "venue": ["X", "Y", "Z", "X", "Y"],
+        "date": pd.date_range("2018-01-01", periods=5),
+        "flag": [True, False, True, True, False],
+    })
+    widget = QgridWidget(df=df)
+    event_history = init_event_history(All, widget=widget)
+
+    widget.set_state(
+        filters={
+            "price": {"min": 60},
+            "venue": {"excluded": ["Z"]},
+            "date": {"max": "2018-01-04"},
+        },
+        sort=[("venue", False), "price"],
+    )
+    assert list(widget._df.index) == [1, 3]
+    assert widget._sort_columns == [["venue", False], ["price", True]]
+    assert widget._columns["venue"]["filter_info"]["excluded"] == [0]
+
+    # the view is recomputed and sent to the browser once for all changes
+    event_names = [event["name"] for event in event_history]
+    assert event_names.count("json_updated") == 1
+    assert event_names.count("filter_changed") == 3
+    assert event_names.count("sort_changed") == 1
+
+    widget.set_state(filters={"price": None, "flag": {"selected": True}})
+    assert list(widget._df.index) == [0, 3]
+
+    # invalid changes are rejected before any of them are applied
+    for state in [
+        {"filters": {"venue": {"selected": ["X"]}, "cost": {"min": 1}}},
+        {"filters": {"price": {"selected": [1]}}},
+        {"filters": {"venue": {"selected": ["X"]}}, "sort": "cost"},
+        {"filters": {"venue": {"selected": ["x"]}, "price": {"min": "abc"}}},
+        {"filters": {"price": {"max": True}}},
+        {"filters": {"date": {"min": "abc"}}},
+        {"filters": {"venue": {"selected": "X"}}},
+        {"filters": {"flag": {"selected": "false"}}},
+    ]:
+        with pytest.raises(ValueError):
+            widget.set_state(**state)
+    assert list(widget._df.index) == [0, 3]
+    assert "filter_info" not in widget._columns["price"]
+    assert widget._columns["venue"]["filter_info"]["excluded"] == [0]
+
+    # an empty sort clears the sort, and omitting it leaves it as it is
+    widget.set_state(filters={"flag": None, "venue": None})
+    assert list(widget._df.index) == [2, 1, 0, 3]
+    widget.set_state(sort=[])
+    assert widget._sort_columns == []
+    assert widget._sort_field is None
+    assert list(widget._df.index) == [0, 1, 2, 3]
+    widget.set_state(sort=("price", False))
+    assert list(widget._df.index) == [2, 1, 3, 0]
+    widget.set_state(filters={"venue": {"excluded": ["Z"]}})
+    assert list(widget._df.index) == [1, 3, 0]
+    widget.set_state(sort=None)
+    assert list(widget._df.index) == [0, 1, 3]
+
+
+def test_dropdown_values_cache_survives_unrelated_changes():
+    df = pd.DataFrame({
+        "venue": ["X", "Y", "X", "Z", "W"],
+        "price": [10, 20, 30, 40, 50],
+    })
+    widget = QgridWidget(df=df)
+
+    def show_dropdown():
+        widget._handle_qgrid_msg_helper({
+            "type": "show_filter_dropdown",
+            "field": "venue",
+            "search_val": None
+        })
+        return widget._sorted_column_cache["venue"]
+
+    cached = show_dropdown()
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "price", "sort_ascending": False}
+    )
+    assert show_dropdown() is cached
+
+    # filtering the column itself doesn't change the values in the
+    # unfiltered rows, which the dropdown shows while the filter is active
+    widget.set_state(filters={"venue": {"selected": ["X"]}})
+    cached = show_dropdown()
+    widget.set_state(filters={"venue": {"selected": ["X", "Y"]}})
+    assert show_dropdown() is cached
+    widget.set_state(filters={"price": {"max": 30}})
+    assert show_dropdown() is cached
+
+    # but values from the filtered rows depend on the other columns' filters
+    widget.set_state(filters={"venue": None})
+    cached = show_dropdown()
+    assert list(widget._filter_tables["venue"]) == ["X", "Y"]
+    widget.set_state(filters={"price": {"max": 40}})
+    assert show_dropdown() is not cached
+    assert list(widget._filter_tables["venue"]) == ["X", "Y", "Z"]
+
+    widget.edit_cell(3, "venue", "V")
+    assert "venue" not in widget._sorted_column_cache
+
+
+def test_dropdown_values_wait_for_background_view_update(monkeypatch):
+    monkeypatch.setattr(grid, "BACKGROUND_MIN_ROWS", 100)
+    df = pd.DataFrame({"A": np.arange(1000)})
+    df["B"] = np.where(df["A"] < 500, "lo", "hi")
+    widget = QgridWidget(df=df)
+    widget.send = lambda content, buffers=None: None
+
+    widget._handle_qgrid_msg_helper({
+        "type": "change_filter",
+        "field": "A",
+        "filter_info": {"field": "A", "type": "slider",
+                        "min": 600, "max": None},
+    })
+    for _ in range(2):
+        widget._handle_qgrid_msg_helper({
+            "type": "show_filter_dropdown",
+            "field": "B",
+            "search_val": None
+        })
+        assert list(widget._filter_tables["B"]) == ["hi"]
+
+
+def test_unfiltered_positions_mapping():
+    df = pd.DataFrame({"A": [10, 20, 30, 40, 50], "B": list("abcde")})
+    widget = QgridWidget(df=df)
+
+    def check_mapping():
+        ids = widget._unfiltered_df[widget._index_col_name].values
+        positions = widget._unfiltered_positions[ids]
+        assert list(positions) == list(range(len(ids)))
+
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": False}
+    )
+    widget.set_state(filters={"A": {"min": 20}})
+    check_mapping()
+
+    widget.add_row()
+    check_mapping()
+    widget.remove_rows([1, 3])
+    check_mapping()
+    assert list(widget._unfiltered_df["A"]) == [10, 30, 50, 50]
+
+    # edits from the grid find the row in the unfiltered frame by position
+    row_index = list(widget._df["B"]).index("c")
+    widget._handle_qgrid_msg_helper({
+        "type": "edit_cell",
+        "column": "B",
+        "row_index": row_index,
+        "unfiltered_index": widget._df[widget._index_col_name].iloc[row_index],
+        "value": "z"
+    })
+    assert list(widget._unfiltered_df["B"]) == ["a", "z", "e", "e"]
+
+
+def test_edit_cells():
+    df = pd.DataFrame({"A": [1.0, 2.0, 3.0, 4.0], "B": list("abcd")},
+                      index=[10, 20, 30, 40])
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": False}
+    )
+    widget.set_state(filters={"A": {"min": 2}})
+    event_history = init_event_history(All, widget=widget)
+
+    widget.edit_cells([(20, "A", 2.5), (40, "B", "z"), (30, "A", 9.0)])
+    assert [event["name"] for event in event_history] == \
+        ["json_updated", "cells_edited"]
+    event = event_history[-1]
+    assert list(event["index"]) == [20, 40, 30]
+    assert list(event["old"]) == [2.0, "d", 3.0]
+    assert list(event["new"]) == [2.5, "z", 9.0]
+
+    updates = pd.DataFrame({"B": ["x", "y"]}, index=[40, 30])
+    widget.edit_cells(updates)
+
+    changed = widget.get_changed_df()
+    assert list(changed.loc[[20, 30, 40], "A"]) == [2.5, 9.0, 4.0]
+    assert list(changed.loc[[20, 30, 40], "B"]) == ["b", "y", "x"]
+    unfiltered = widget._unfiltered_df
+    assert list(unfiltered["A"]) == [1.0, 2.5, 9.0, 4.0]
+    assert list(unfiltered["B"]) == ["a", "b", "y", "x"]
+
+    with pytest.raises(KeyError):
+        widget.edit_cells([(10, "A", 0.0)])
+    with pytest.raises(KeyError):
+        widget.edit_cells([(20, "C", 0.0)])
+
+
+def test_edit_cells_datetime_values():
+    df = pd.DataFrame({"D": pd.to_datetime(["2020-01-03", "2020-01-04"])})
+    widget = QgridWidget(df=df)
+    event_history = init_event_history("cells_edited", widget=widget)
+
+    widget.edit_cells([(0, "D", pd.Timestamp("2021-01-01"))])
+    assert list(event_history[-1]["old"]) == [pd.Timestamp("2020-01-03")]
+    assert widget._unfiltered_df["D"].dtype == df["D"].dtype
+
+
+def test_add_rows():
+    df = pd.DataFrame({
+        "A": np.array([1, 2], dtype="int32"),
+        "B": pd.Categorical(["x", "y"]),
+        "C": pd.to_datetime(["2018-01-01", "2018-01-02"]),
+    })
+    widget = QgridWidget(df=df)
+    event_history = init_event_history(All, widget=widget)
+
+    new_rows = pd.DataFrame({
+        "C": pd.to_datetime(["2018-02-01", "2018-02-02", "2018-02-03"]),
+        "A": [3, 4, 5],
+        "B": ["y", "x", "x"],
+    }, index=[2, 3, 4])
+    widget.add_rows(new_rows)
+
+    assert [event["name"] for event in event_history] == \
+        ["json_updated", "rows_added"]
+    assert event_history[-1]["indices"] == [2, 3, 4]
+
+    for frame in [widget._df, widget._unfiltered_df]:
+        assert list(frame.index) == [0, 1, 2, 3, 4]
+        assert list(frame["A"]) == [1, 2, 3, 4, 5]
+        assert list(frame["qgrid_unfiltered_index"]) == [0, 1, 2, 3, 4]
+        assert frame["A"].dtype == np.dtype("int32")
+        assert frame["B"].dtype == df["B"].dtype
+    assert list(widget._unfiltered_positions) == [0, 1, 2, 3, 4]
+
+    with pytest.raises(ValueError):
+        widget.add_rows(pd.DataFrame({"A": [6]}, index=[5]))
+
+    # indices that are already in the grid, or repeated, are rejected
+    for index in [[4, 5], [5, 5]]:
+        with pytest.raises(ValueError):
+            widget.add_rows(pd.DataFrame({
+                "A": [6, 7],
+                "B": ["x", "y"],
+                "C": pd.to_datetime(["2018-03-01", "2018-03-02"]),
+            }, index=index))
+    assert len(widget._unfiltered_df) == 5
+
+    # a duplicated row gets an index that isn't used by filtered out rows
+    widget.set_state(filters={"A": {"max": 3}})
+    widget.add_row()
+    assert list(widget._unfiltered_df.index) == [0, 1, 2, 3, 4, 5]
+
+
+def test_remove_rows_keeps_sorted_filtered_view():
+    df = pd.DataFrame({"A": np.arange(20) % 7, "B": np.arange(20)})
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": False}
+    )
+    widget._handle_qgrid_msg_helper({
+        "type": "change_filter",
+        "field": "B",
+        "filter_info": {"field": "B", "type": "slider",
+                        "min": 2, "max": None},
+    })
+    expected = [x for x in widget._df.index if x % 3 != 0]
+    removed = [x for x in widget._df.index if x % 3 == 0]
+
+    widget.remove_rows(rows=removed)
+
+    assert list(widget._df.index) == expected
+    assert set(widget._unfiltered_df.index) == set(range(20)) - set(removed)
+    # the cached sort key and filter mask were cut down rather than discarded
+    assert len(widget._sort_key_cache["A"][0]) == len(widget._unfiltered_df)
+    assert len(widget._filter_masks["B"][1]) == len(widget._unfiltered_df)
+
+    # changing the sort afterwards still works from the reduced caches
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "B", "sort_ascending": True}
+    )
+    assert list(widget._df.index) == sorted(expected)
+
+    with pytest.raises(KeyError):
+        widget.remove_rows(rows=[0])
+
+    widget._handle_qgrid_msg_helper(
+        {"rows": [0, 1], "type": "change_selection"}
+    )
+    widget._handle_qgrid_msg_helper({"type": "remove_row"})
+    assert list(widget._df.index) == sorted(expected)[2:]
+
+
+def test_undo_redo():
+    df = pd.DataFrame({"A": [1.0, 2.0, 3.0, 4.0], "B": list("abcd")},
+                      index=[10, 20, 30, 40])
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": False}
+    )
+    assert not widget.undo()
+
+    widget.edit_cells([(20, "A", 2.5), (40, "B", "z")])
+    widget.remove_rows(rows=[30, 10])
+    widget.add_rows(pd.DataFrame({"A": [5.0], "B": ["e"]}, index=[50]))
+    event_history = init_event_history(
+        ["cells_edited", "rows_added", "row_removed"], widget=widget
+    )
+
+    assert widget.undo()
+    assert list(widget._df.index) == [40, 20]
+    assert widget.undo()
+    assert list(widget._df.index) == [40, 30, 20, 10]
+    assert list(widget._unfiltered_df.index) == [10, 20, 30, 40]
+    assert widget.undo()
+    assert list(widget._unfiltered_df["A"]) == [1.0, 2.0, 3.0, 4.0]
+    assert list(widget._df["B"]) == ["d", "c", "b", "a"]
+    assert not widget.undo()
+
+    assert [(e["name"], e["source"]) for e in event_history] == [
+        ("row_removed", "undo"), ("rows_added", "undo"),
+        ("cells_edited", "undo")
+    ]
+    assert event_history[0]["indices"] == [50]
+    assert event_history[1]["indices"] == [10, 30]
+    assert list(event_history[2]["new"]) == [2.0, "d"]
+
+    # redoing is done through the grid interface's undo/redo messages
+    widget._handle_qgrid_msg_helper({"type": "redo"})
+    widget._handle_qgrid_msg_helper({"type": "redo"})
+    assert list(widget._df.index) == [40, 20]
+    assert list(widget._df["A"]) == [4.0, 2.5]
+
+    # a new edit discards the edits that could be redone
+    widget.edit_cell(40, "A", 7.0)
+    assert not widget.redo()
+    assert widget.undo()
+    assert widget._df.loc[40, "A"] == 4.0
+
+    # ids of removed rows aren't reused by added rows
+    widget.add_rows(pd.DataFrame({"A": [6.0], "B": ["f"]}, index=[60]))
+    ids = widget._unfiltered_df[widget._index_col_name]
+    assert ids.is_unique and ids.loc[60] == 5
+
+
+def test_undo_uses_current_filters_and_sort():
+    widget = QgridWidget(df=pd.DataFrame({"A": [1, 2, 3, 4, 5]}))
+    widget.remove_rows([0, 1])
+    widget.set_state(filters={"A": {"min": 4}})
+    assert widget.undo()
+    assert list(widget._df["A"]) == [4, 5]
+    assert list(widget._unfiltered_df["A"]) == [1, 2, 3, 4, 5]
+
+    widget = QgridWidget(df=pd.DataFrame({"A": [1, 2, 3, 4, 5]}))
+    widget.set_state(sort=("A", False))
+    widget.remove_rows([2])
+    widget.set_state(sort=("A", True))
+    assert widget.undo()
+    assert list(widget._df["A"]) == [1, 2, 3, 4, 5]
+    assert widget.redo()
+    assert list(widget._df["A"]) == [1, 2, 4, 5]
+
+
+def test_undo_datetime_edit():
+    dates = pd.to_datetime(["2020-01-03", "2020-01-04"])
+    df = pd.DataFrame({"D": dates, "T": dates.tz_localize("US/Eastern")})
+    widget = QgridWidget(df=df)
+    widget.edit_cells([(0, "D", pd.Timestamp("2021-01-01")),
+                       (1, "T", pd.Timestamp("2021-01-01", tz="US/Eastern"))])
+    assert widget.undo()
+    for frame in [widget._df, widget._unfiltered_df]:
+        assert frame["D"].dtype == df["D"].dtype
+        assert frame["T"].dtype == df["T"].dtype
+        assert list(frame["D"]) == list(df["D"])
+        assert list(frame["T"]) == list(df["T"])
+    assert widget.redo()
+    assert widget._df.loc[0, "D"] == pd.Timestamp("2021-01-01")
+
+
+def test_undo_journal_is_bounded(monkeypatch):
+    monkeypatch.setattr(grid, "UNDO_MAX_CELLS", 3)
+    widget = QgridWidget(df=pd.DataFrame({"A": [1, 2, 3, 4]}))
+    for value in [10, 20, 30, 40]:
+        widget.edit_cell(0, "A", value)
+    for value in [30, 20, 10]:
+        assert widget.undo()
+        assert widget._df.loc[0, "A"] == value
+    assert not widget.undo()
+
+    widget.edit_cells([(0, "A", 5), (1, "A", 5), (2, "A", 5), (3, "A", 5)])
+    assert not widget.undo()
+
+
+def test_get_edits():
+    df = pd.DataFrame({"A": [1.0, 2.0, 3.0, 4.0], "B": list("abcd")},
+                      index=[10, 20, 30, 40])
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": False}
+    )
+    edits = widget.get_edits()
+    assert len(edits["edited_cells"]) == 0
+    assert len(edits["added_rows"]) == 0
+    assert edits["removed_indices"] == []
+
+    widget.edit_cells([(20, "A", 2.5), (40, "B", "z"), (30, "B", "c")])
+    widget.edit_cell(20, "A", 2.75)
+    widget.edit_cell(10, "B", "y")
+    widget.undo()
+    widget.remove_rows(rows=[30])
+    widget.add_rows(pd.DataFrame({"A": [5.0], "B": ["e"]}, index=[50]))
+    widget.edit_cell(50, "B", "f")
+
+    edits = widget.get_edits()
+    edited_cells = edits["edited_cells"]
+    assert list(edited_cells.index) == [20, 40]
+    assert list(edited_cells["column"]) == ["A", "B"]
+    assert list(edited_cells["old"]) == [2.0, "d"]
+    assert list(edited_cells["new"]) == [2.75, "z"]
+    assert list(edits["added_rows"].index) == [50]
+    assert list(edits["added_rows"].columns) == ["A", "B"]
+    assert edits["added_rows"].loc[50, "B"] == "f"
+    assert edits["removed_indices"] == [30]
+
+    widget.checkpoint()
+    edits = widget.get_edits()
+    assert len(edits["edited_cells"]) == 0
+    assert len(edits["added_rows"]) == 0
+    assert edits["removed_indices"] == []
+
+    # undoing an edit made before the checkpoint is still an edit
+    widget.undo()
+    widget.undo()
+    edits = widget.get_edits()
+    assert edits["removed_indices"] == [50]
+    assert list(widget.get_edits()["edited_cells"].index) == []
+    widget.undo()
+    edits = widget.get_edits()
+    assert edits["removed_indices"] == [50]
+    assert list(edits["added_rows"].index) == [30]
+
+
+def test_get_edits_datetime_values():
+    dates = pd.to_datetime(["2020-01-03", "2020-01-04"])
+    widget = QgridWidget(df=pd.DataFrame({"D": dates}))
+    widget.edit_cell(1, "D", pd.Timestamp("2021-01-01"))
+
+    edited_cells = widget.get_edits()["edited_cells"]
+    assert list(edited_cells.index) == [1]
+    assert list(edited_cells["old"]) == [pd.Timestamp("2020-01-04")]
+    assert list(edited_cells["new"]) == [pd.Timestamp("2021-01-01")]
+
+
+def test_edits_send_cell_patches():
+    df = pd.DataFrame({
+        "A": np.arange(300, dtype="float64"),
+        "B": ["x%d" % i for i in range(300)],
+        "C": pd.date_range("2018-01-01", periods=300),
+    })
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": False}
+    )
+    sent = []
+    widget.send = lambda content, buffers=None: sent.append(content)
+    # trait changes are synced to the browser with send_state
+    synced_json = []
+    widget.send_state = lambda key=None: synced_json.extend(
+        [key] if key == "_df_json" else []
+    )
+    event_history = init_event_history(All, widget=widget)
+
+    widget.edit_cells([(299, "A", 1.5), (298, "B", "y"), (0, "B", "z"),
+                       (297, "C", pd.Timestamp("2019-01-01"))])
+    assert [msg["type"] for msg in sent] == ["patch_cells"]
+    # row 0 is at the end of the view, outside of the rows sent to the grid
+    assert sent[0]["cells"] == [
+        [0, "A", 1.5], [1, "B", "y"], [2, "C", "2019-01-01T00:00:00.000"]
+    ]
+    assert event_history[0] == {
+        "name": "json_updated",
+        "triggered_by": "edit_cell",
+        "range": (0, 100),
+    }
+    # the window isn't sent again, the browser patches its own copy
+    assert synced_json == []
+
+    # _df_json is brought up to date when the window is next rendered
+    widget._update_table(fire_data_change_event=False)
+    assert len(synced_json) == 1
+    assert json.loads(widget._df_json)["data"][0]["A"] == 1.5
+
+    widget.undo()
+    assert sent[-1]["type"] == "patch_cells"
+    assert sent[-1]["cells"][0] == [0, "A", 299.0]
+
+    widget.edit_cell(0, "A", 2.0)
+    assert sent[-1] == {"type": "patch_cells", "cells": []}
+
+    # rendering json that's equal to the unpatched value still sends it,
+    # since the browser's copy has been patched since
+    widget._update_table(fire_data_change_event=False)
+    widget._update_table(fire_data_change_event=False)
+    del synced_json[:]
+    widget.edit_cell(299, "A", 5.0)
+    widget.undo()
+    assert synced_json == []
+    json_before = widget._df_json
+    widget._update_table(fire_data_change_event=False)
+    assert widget._df_json == json_before
+    assert synced_json == ["_df_json"]
+
+
+def test_paste_and_fill_down():
+    df = pd.DataFrame({
+        "A": np.array([1, 2, 3, 4], dtype="int64"),
+        "B": [1.5, 2.5, 3.5, 4.5],
+        "C": pd.to_datetime(["2018-01-01"] * 4),
+        "D": [True, False, True, False],
+        "E": list("abcd"),
+    }, index=[10, 20, 30, 40])
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": False}
+    )
+    sent = []
+    widget.send = lambda content, buffers=None: sent.append(content)
+    event_history = init_event_history(["cells_edited"], widget=widget)
+
+    widget._handle_qgrid_msg_helper({
+        "type": "paste_cells",
+        "row_start": 1,
+        "row_end": 3,
+        "columns": ["A", "B", "C", "D"],
+        "values": [["7", "", "2019-02-03", "false"],
+                   ["8", "9.25", "2019-02-04", "TRUE"]],
+    })
+    changed = widget.get_changed_df()
+    assert list(changed.index) == [40, 30, 20, 10]
+    assert list(changed["A"]) == [4, 7, 8, 1]
+    assert np.isnan(changed["B"].iloc[1]) and changed["B"].iloc[2] == 9.25
+    assert list(changed["C"].iloc[1:3]) == \
+        list(pd.to_datetime(["2019-02-03", "2019-02-04"]))
+    assert list(changed["D"]) == [False, False, True, True]
+    assert list(changed.dtypes) == list(df.dtypes)
+    assert list(widget._unfiltered_df["A"]) == [1, 8, 7, 4]
+    assert [msg["type"] for msg in sent] == ["patch_cells"]
+    assert len(sent[0]["cells"]) == 8
+    event = event_history[-1]
+    assert list(event["index"][:2]) == [30, 20]
+    assert event["source"] == "gui"
+
+    # nothing is written if any of the values is invalid
+    widget._handle_qgrid_msg_helper({
+        "type": "paste_cells",
+        "row_start": 0,
+        "row_end": 2,
+        "columns": ["B", "A"],
+        "values": [["1.0", "5"], ["2.0", "5.5"]],
+    })
+    assert sent[-1]["type"] == "show_error"
+    assert list(widget.get_changed_df()["B"].iloc[:1]) == [4.5]
+    assert len(event_history) == 1
+
+    widget._handle_qgrid_msg_helper({
+        "type": "fill_down",
+        "row_start": 0,
+        "row_end": 4,
+        "columns": ["E"],
+    })
+    assert list(widget.get_changed_df()["E"]) == ["d"] * 4
+    assert widget.undo()
+    assert list(widget.get_changed_df()["E"]) == ["d", "c", "b", "a"]
+
+
+def test_undo_paste_keeps_column_types():
+    dates = pd.to_datetime(["2020-01-03", "2020-01-04", "2020-01-05"])
+    df = pd.DataFrame({
+        "D": dates,
+        "T": dates.tz_localize("US/Eastern"),
+        "C": pd.Categorical(["a", "b", "a"]),
+    })
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper({
+        "type": "paste_cells",
+        "row_start": 0,
+        "row_end": 2,
+        "columns": ["D", "T", "C"],
+        "values": [["2021-01-01", "2021-01-02", "b"]],
+    })
+    assert widget.undo()
+    for frame in [widget._df, widget._unfiltered_df]:
+        for col_name in df.columns:
+            assert frame[col_name].dtype == df[col_name].dtype
+            assert list(frame[col_name]) == list(df[col_name])
+
+
+def test_selection_ranges():
+    df = pd.DataFrame({"A": np.arange(1000) % 10, "B": np.arange(1000)})
+    widget = QgridWidget(df=df)
+    widget.set_state(filters={"A": {"min": 5}})
+    sent = []
+    widget.send = lambda content, buffers=None: sent.append(content)
+
+    widget.select_all()
+    assert sent[-1] == {"type": "change_selection", "ranges": [[0, 500]]}
+    assert len(widget.get_selected_df()) == 500
+
+    event_history = init_event_history("selection_changed", widget=widget)
+    widget._handle_qgrid_msg_helper({
+        "type": "change_selection",
+        "ranges": [[10, 20], [0, 5], [15, 30], [30, 32]],
+    })
+    assert widget._selection_ranges.tolist() == [[0, 5], [10, 32]]
+    assert widget.get_selected_rows() == list(range(5)) + list(range(10, 32))
+    assert event_history[-1]["new"] == widget.get_selected_rows()
+    assert list(widget.get_selected_df()["B"][:6]) == [5, 6, 7, 8, 9, 25]
+
+    widget.remove_rows()
+    assert len(widget._df) == 500 - 27
+    assert list(widget._df["B"][:6]) == [15, 16, 17, 18, 19, 67]
+    assert widget.get_selected_rows() == []
+
+    # rows selected in a view that has since been filtered down are ignored
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_selection", "ranges": [[400, 473]]}
+    )
+    widget.set_state(filters={"A": {"min": 9}})
+    assert len(widget.get_selected_df()) == 0
+
+
+def test_change_selection_by_index():
+    index = pd.MultiIndex.from_product([["x", "y"], [1, 2, 3]])
+    df = pd.DataFrame({"A": np.arange(6), "B": list("abcdef")}, index=index)
+    widget = QgridWidget(df=df)
+    widget._handle_qgrid_msg_helper(
+        {"type": "change_sort", "sort_field": "A", "sort_ascending": False}
+    )
+
+    widget.change_selection([("x", 2), ("y", 3), ("y", 2)])
+    assert widget.get_selected_rows() == [0, 1, 4]
+    selected_df = widget.get_selected_df()
+    assert list(selected_df.columns) == ["A", "B"]
+    assert list(selected_df["B"]) == ["f", "e", "b"]
+
+    with pytest.raises(KeyError):
+        widget.change_selection([("x", 1), ("z", 1)])
+    assert widget.get_selected_rows() == [0, 1, 4]
+
+    widget.change_selection()
+    assert len(widget.get_selected_df()) == 0
+
+
+def test_async_event_dispatch(monkeypatch):
+    import threading
+    # module-level listeners registered by other tests would fill the queue
+    monkeypatch.setattr(grid, "handlers", grid._EventHandlers())
+    widget = QgridWidget(df=create_df())
+    started = threading.Event()
+    release = threading.Event()
+    handled = []
+    all_handled = threading.Event()
+
+    def slow_listener(event, qgrid_widget):
+        started.set()
+        release.wait(5)
+        handled.append(event["new"])
+        if len(handled) == 2:
+            all_handled.set()
+
+    def failing_listener(event, qgrid_widget):
+        raise ValueError("listener failed")
+
+    widget.on("selection_changed", failing_listener)
+    widget.on("selection_changed", slow_listener)
+    grid.set_event_dispatch("async", max_workers=1, max_pending=3)
+    try:
+        # the messages are handled without waiting for the slow listener,
+        # and the failing listener doesn't stop it from being called
+        widget._handle_qgrid_msg_helper(
+            {"type": "change_selection", "rows": [1]}
+        )
+        assert started.wait(5)
+        widget._handle_qgrid_msg_helper(
+            {"type": "change_selection", "rows": [2]}
+        )
+        assert widget.get_selected_rows() == [2]
+        # the queue is full, so these calls are dropped
+        widget._handle_qgrid_msg_helper(
+            {"type": "change_selection", "rows": [3]}
+        )
+        assert handled == []
+        release.set()
+        assert all_handled.wait(5)
+        assert handled == [[1], [2]]
+    finally:
+        grid.set_event_dispatch("sync")
+
+    with pytest.raises(ValueError):
+        widget._handle_qgrid_msg_helper(
+            {"type": "change_selection", "rows": [0]}
+        )
+    with pytest.raises(ValueError):
+        grid.set_event_dispatch("threads")